@@ -1,5 +1,6 @@
-from collections import UserDict
-from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from collections import UserDict, defaultdict
+from datetime import date, datetime
 import pickle
 import re
 
@@ -40,13 +41,26 @@ class Record:
         self.name = Name(name)
         self.phones = []
         self.birthday = Birthday(birthday) if birthday else None
+        self.book = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["book"] = None
+        return state
+
+    def changed(self):
+        # Phones are searched through the book's index, so it has to hear about edits.
+        if getattr(self, "book", None) is not None:
+            self.book.reindex(self.name.value)
 
     def add_phone(self, phone_number):
         phone = Phone(phone_number)
         self.phones.append(phone)
+        self.changed()
 
     def remove_phone(self, phone_number):
         self.phones = [phone for phone in self.phones if phone.value != phone_number]
+        self.changed()
 
     def edit_phone(self, old_phone_number, new_phone_number):
         if not Phone.validate_phone_number(new_phone_number):
@@ -60,6 +74,7 @@ class Record:
         
         if not found:
             raise ValueError("Phone number not found in the record")
+        self.changed()
             
 
     def find_phone(self, phone_number):
@@ -104,21 +119,196 @@ class Birthday(Field):
             raise ValueError("Invalid date format")
         self._value = new_birthday
 
+class SearchIndex:
+    # Contact names by every substring of up to GRAM_SIZE characters of the
+    # name and of each phone, and by phone prefix and suffix. Longer queries
+    # intersect the sets of their grams and only those candidates are checked.
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self.name_grams = defaultdict(set)
+        self.phone_grams = defaultdict(set)
+        self.phone_prefixes = defaultdict(set)
+        self.phone_suffixes = defaultdict(set)
+        self.entries = {}
+
+    @classmethod
+    def get_grams(cls, text):
+        return {text[start:start + size] for size in range(1, cls.GRAM_SIZE + 1) for start in range(len(text) - size + 1)}
+
+    @staticmethod
+    def get_affixes(phone):
+        return [phone[:end] for end in range(1, len(phone) + 1)], [phone[-end:] for end in range(1, len(phone) + 1)]
+
+    def add(self, name, record):
+        self.remove(name)
+        # What was indexed is kept, so remove() still works after the record changed.
+        phones = tuple(phone.value for phone in record.phones)
+        self.entries[name] = phones
+        for gram in self.get_grams(name):
+            self.name_grams[gram].add(name)
+        for phone in phones:
+            for gram in self.get_grams(phone):
+                self.phone_grams[gram].add(name)
+            prefixes, suffixes = self.get_affixes(phone)
+            for prefix in prefixes:
+                self.phone_prefixes[prefix].add(name)
+            for suffix in suffixes:
+                self.phone_suffixes[suffix].add(name)
+
+    def remove(self, name):
+        phones = self.entries.pop(name, None)
+        if phones is None:
+            return
+        self.discard(self.name_grams, self.get_grams(name), name)
+        for phone in phones:
+            self.discard(self.phone_grams, self.get_grams(phone), name)
+            prefixes, suffixes = self.get_affixes(phone)
+            self.discard(self.phone_prefixes, prefixes, name)
+            self.discard(self.phone_suffixes, suffixes, name)
+
+    @staticmethod
+    def discard(index, keys, name):
+        for key in keys:
+            names = index.get(key)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del index[key]
+
+    def lookup(self, grams, query, get_texts):
+        if len(query) <= self.GRAM_SIZE:
+            return set(grams.get(query, ()))
+        postings = sorted((grams.get(query[start:start + self.GRAM_SIZE], set())
+                           for start in range(len(query) - self.GRAM_SIZE + 1)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return {name for name in candidates if any(query in text for text in get_texts(name))}
+
+    def search(self, query):
+        # Ranked: exact name or phone first, then name and phone
+        # prefixes, phone suffixes, and anything else containing the query.
+        if not query:
+            return sorted(self.entries)
+        ranks = {}
+
+        def rank(names, score):
+            for name in names:
+                if score < ranks.get(name, score + 1):
+                    ranks[name] = score
+
+        for name in self.lookup(self.name_grams, query, lambda name: (name,)):
+            rank((name,), 0 if name == query else 1 if name.startswith(query) else 3)
+        for name in self.lookup(self.phone_grams, query, lambda name: self.entries[name]):
+            rank((name,), 0 if query in self.entries[name] else 3)
+        rank(self.phone_prefixes.get(query, ()), 1)
+        rank(self.phone_suffixes.get(query, ()), 2)
+        return sorted(ranks, key=lambda name: (ranks[name], name))
+
+
+def get_birthday_key(name, record):
+    if not record.birthday:
+        return None
+    day, month, year = record.birthday.value.split("/")
+    return int(month), int(day), name
+
+
 class AddressBook(UserDict):
+    ORDERS = ("name", "birthday")
+
     def __init__(self):
         self.data = {}
+        self.index = SearchIndex()
+        # Names in order and (month, day, name) of every birthday in order,
+        # kept sorted on every change so pages never sort the book.
+        self.by_name = []
+        self.by_birthday = []
+        self.birthday_keys = {}
         self.page_size = 10
-        
-    def iterator(self):
-        page = 0  
-        while page * self.page_size < len(self.data):
-            start = page * self.page_size
-            end = (page + 1) * self.page_size
-            yield list(self.data.values())[start:end]
-            page += 1
+
+    def get_segments(self, cursor, order, today):
+        if order == "name":
+            return [(bisect_right(self.by_name, cursor) if cursor is not None else 0, len(self.by_name))]
+        # Birthdays run from today to the end of the year and wrap round to
+        # the ones before today. A cursor before today is past the wrap.
+        anchor = (today.month, today.day)
+        split = bisect_left(self.by_birthday, anchor)
+        if cursor is None:
+            return [(split, len(self.by_birthday)), (0, split)]
+        position = bisect_right(self.by_birthday, tuple(cursor))
+        if tuple(cursor[:2]) >= anchor:
+            return [(position, len(self.by_birthday)), (0, split)]
+        return [(position, split)]
+
+    def page(self, cursor=None, size=None, order="name", today=None):
+        # Returns [(name, record), ...] after cursor and the cursor of the
+        # next page, None after the last one. A cursor is the key of the last
+        # row: the name, or (month, day, name) for birthdays. Rows added or
+        # removed meanwhile do not shift the pages that follow. Birthday
+        # pages of one walk should get the same today.
+        if order not in self.ORDERS:
+            raise ValueError(f"order must be one of {self.ORDERS}")
+        size = size or self.page_size
+        keys = self.by_name if order == "name" else self.by_birthday
+        segments = self.get_segments(cursor, order, today or date.today())
+        rows = []
+        for start, stop in segments:
+            rows.extend(keys[start:min(stop, start + size - len(rows))])
+        names = rows if order == "name" else [key[2] for key in rows]
+        remaining = sum(stop - start for start, stop in segments)
+        next_cursor = rows[-1] if rows and remaining > len(rows) else None
+        return [(name, self.data[name]) for name in names], next_cursor
+
+    def iterator(self, order="name", cursor=None):
+        today = date.today()
+        while True:
+            rows, cursor = self.page(cursor, order=order, today=today)
+            if rows:
+                yield [record for _, record in rows]
+            if cursor is None:
+                break
+
+    def __setitem__(self, name, record):
+        if name not in self.data:
+            insort(self.by_name, name)
+        self.data[name] = record
+        record.book = self
+        self.index.add(name, record)
+        self.update_birthday(name, record)
+
+    def __delitem__(self, name):
+        self.data.pop(name).book = None
+        del self.by_name[bisect_left(self.by_name, name)]
+        self.index.remove(name)
+        self.update_birthday(name, None)
+
+    def update_birthday(self, name, record):
+        old = self.birthday_keys.pop(name, None)
+        if old is not None:
+            del self.by_birthday[bisect_left(self.by_birthday, old)]
+        new = get_birthday_key(name, record) if record is not None else None
+        if new is not None:
+            self.birthday_keys[name] = new
+            insort(self.by_birthday, new)
+
+    def reindex(self, name):
+        if name in self.data:
+            self.index.add(name, self.data[name])
+
+    def rebuild_index(self):
+        self.index = SearchIndex()
+        for name, record in self.data.items():
+            record.book = self
+            self.index.add(name, record)
+        self.by_name = sorted(self.data)
+        self.birthday_keys = {}
+        for name, record in self.data.items():
+            key = get_birthday_key(name, record)
+            if key is not None:
+                self.birthday_keys[name] = key
+        self.by_birthday = sorted(self.birthday_keys.values())
 
     def add_record(self, record):
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
     def find(self, name):
         if name in self.data:
@@ -127,7 +317,7 @@ class AddressBook(UserDict):
 
     def delete(self, name):
         if name in self.data:
-            del self.data[name]
+            del self[name]
 
     def save_to_file(self, filename):
         data = {"contacts": self.data}
@@ -140,12 +330,9 @@ class AddressBook(UserDict):
                 data = pickle.load(f)
                 if "contacts" in data:
                     self.data = data["contacts"]
+                    self.rebuild_index()
         except FileNotFoundError:
             print("File not found")
 
     def search(self, query):
-        search_match = []
-        for name, record in self.data.items():
-            if query in name or any(query in phone.value for phone in record.phones):
-                search_match.append(record)
-        return search_match
\ No newline at end of file
+        return [self.data[name] for name in self.index.search(query)]
\ No newline at end of file
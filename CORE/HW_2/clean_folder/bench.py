@@ -0,0 +1,213 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from files_generator import generate_tree
+from clean_folder.clean import Sorter, move_files, unpack_files, walk
+from clean_folder.sniff import Sniffer
+
+
+STAGES = ("scan", "classify", "move", "unpack", "prune")
+COUNTED = ("scandir", "listdir", "stat", "lstat", "open", "replace", "rename", "link", "unlink",
+           "mkdir", "rmdir", "fsync", "sendfile", "copy_file_range")
+BASELINE = Path(__file__).with_name("bench_baseline.json")
+
+
+def get_io_syscalls():
+    # read/write syscall totals of this process; Linux only.
+    try:
+        with open("/proc/self/io") as file:
+            fields = dict(line.split(": ") for line in file.read().splitlines())
+        return int(fields["syscr"]), int(fields["syscw"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+@contextmanager
+def count_syscalls(counts):
+    # Wraps the os functions the sorter goes through. They are looked up on
+    # the os module at call time, pathlib and shutil included.
+    originals = {name: getattr(os, name) for name in COUNTED if hasattr(os, name)}
+
+    def counted(name, func):
+        def wrapper(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(os, name, counted(name, func))
+    try:
+        yield counts
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+
+class Probe:
+    # One pass over the pipeline. Timing passes count syscalls, the memory
+    # pass runs under tracemalloc, which would distort the timings.
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        result = self.stages[name] = {}
+        counts = {}
+        reads, writes = get_io_syscalls()
+        if self.memory:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        with count_syscalls(counts):
+            yield result
+        result["seconds"] = time.perf_counter() - start
+        if self.memory:
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1] - current
+        new_reads, new_writes = get_io_syscalls()
+        counts["read"], counts["write"] = new_reads - reads, new_writes - writes
+        result["syscalls"] = counts
+
+
+def run_pipeline(root, sniff, probe):
+    sorter = Sorter(root)
+    with probe.stage("scan") as result:
+        records = list(walk(root, sorter.folders))
+        result["items"] = len(records)
+    with probe.stage("classify") as result:
+        if sniff:
+            records = list(Sniffer().classify_records(records))
+        files = sorter.scan(records)
+        result["items"] = len(records)
+    with probe.stage("move") as result:
+        move_files(root, files)
+        result["items"] = len(records) - len(files["Archives"])
+    with probe.stage("unpack") as result:
+        kept = unpack_files(root, files)
+        result["items"] = len(files["Archives"])
+    with probe.stage("prune") as result:
+        sorter.prune(kept)
+        result["items"] = len(sorter.folders)
+
+
+def get_work_folder(folder):
+    if folder is not None:
+        return folder
+    # tmpfs keeps disk writeback out of the numbers when it is available.
+    shm = Path("/dev/shm")
+    return shm if shm.is_dir() and os.access(shm, os.W_OK) else None
+
+
+def bench(args):
+    files = None
+    timings = []
+    with tempfile.TemporaryDirectory(prefix="clean_folder-bench-", dir=get_work_folder(args.dir)) as tmp:
+        for number in range(args.repeat + 1):
+            root = Path(tmp) / f"run{number}"
+            files, _ = generate_tree(root, args.files, seed=args.seed, workers=args.workers)
+            memory = number == args.repeat
+            probe = Probe(memory)
+            if memory:
+                tracemalloc.start()
+            try:
+                run_pipeline(root, args.sniff, probe)
+            finally:
+                if memory:
+                    tracemalloc.stop()
+            timings.append(probe.stages)
+
+    memory_pass = timings.pop()
+    stages = {}
+    for name in STAGES:
+        best = min((run[name] for run in timings), key=lambda result: result["seconds"])
+        stages[name] = {
+            "seconds": best["seconds"],
+            "items": best["items"],
+            "items_per_second": best["items"] / best["seconds"] if best["seconds"] else None,
+            "peak_bytes": memory_pass[name]["peak_bytes"],
+            "syscalls": best["syscalls"],
+        }
+    return {
+        "files": files,
+        "seed": args.seed,
+        "sniff": args.sniff,
+        "repeat": args.repeat,
+        "total_seconds": sum(stage["seconds"] for stage in stages.values()),
+        "stages": stages,
+    }
+
+
+def compare(result, baseline, threshold, min_seconds):
+    if (baseline["files"], baseline["seed"], baseline["sniff"]) != (result["files"], result["seed"], result["sniff"]):
+        raise SystemExit("Baseline was taken on a different tree; save a new one with --save-baseline")
+    if any("items_per_second" not in stage for stage in baseline["stages"].values()):
+        raise SystemExit("Baseline has no per-stage throughput; save a new one with --save-baseline")
+
+    regressions = []
+    for name, stage in result["stages"].items():
+        old = baseline["stages"].get(name)
+        if old is None:
+            continue
+        # Stages this short are mostly noise. Throughput is per item of the
+        # stage, so a stage that handles more or fewer items compares fairly.
+        rate, old_rate = stage.get("items_per_second"), old.get("items_per_second")
+        if (max(stage["seconds"], old["seconds"]) >= min_seconds and rate and old_rate
+                and rate * (1 + threshold) < old_rate):
+            regressions.append(f"{name}: {old_rate:.0f} -> {rate:.0f} items/s "
+                               f"({old['seconds']:.4f}s -> {stage['seconds']:.4f}s)")
+        if stage["peak_bytes"] > max(old["peak_bytes"], 1024 * 1024) * (1 + threshold):
+            regressions.append(f"{name}: peak {old['peak_bytes']} -> {stage['peak_bytes']} bytes")
+    return regressions
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Time every stage of the sorter on a generated tree")
+    parser.add_argument("--files", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timing passes; the fastest one is reported")
+    parser.add_argument("--sniff", action="store_true", help="sniff file headers in the classify stage")
+    parser.add_argument("--workers", type=int, default=None, help="processes used to generate the tree")
+    parser.add_argument("--dir", type=Path, help="where to build the tree, /dev/shm by default when it exists")
+    parser.add_argument("--output", type=Path, help="write the JSON here instead of stdout")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 is 20%%")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="stages faster than this are not compared")
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    result = bench(args)
+    report = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(report)
+    else:
+        print(report)
+
+    if args.save_baseline:
+        args.baseline.write_text(report)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, nothing to compare", file=sys.stderr)
+        return
+
+    regressions = compare(result, json.loads(args.baseline.read_text()), args.threshold, args.min_seconds)
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
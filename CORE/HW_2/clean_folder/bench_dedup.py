@@ -0,0 +1,59 @@
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from files_generator import generate_tree
+from clean_folder import clean
+from clean_folder.dedup import find_duplicates
+
+
+def scale_tree(root, target, duplicates, seed):
+    # Copies of a small generated tree, most with a unique trailer so only
+    # a share are real duplicates.
+    random.seed(seed)
+    base = [path for path, _, _ in clean.walk(root)]
+    copies = root / "copies"
+    copies.mkdir()
+    for number in range(target - len(base)):
+        source = random.choice(base)
+        copy = copies / f"{number}{source.suffix}"
+        shutil.copyfile(source, copy)
+        if random.random() >= duplicates:
+            with open(copy, "ab") as file:
+                file.write(number.to_bytes(4, "little"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the dedup stage on a files_generator tree")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of copies left byte-identical")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "Temp"
+        generate_tree(root, 200, seed=args.seed)
+        scale_tree(root, args.files, args.duplicates, args.seed)
+        paths = [path for path, _, _ in clean.walk(root)]
+
+        stats = {}
+        start = time.perf_counter()
+        find_duplicates(paths, args.workers, stats)
+        elapsed = time.perf_counter() - start
+
+    print(f"files:          {stats['files']}")
+    print(f"partial hashed: {stats['partial_hashed']}")
+    print(f"full hashed:    {stats['full_hashed']}")
+    print(f"duplicates:     {stats['duplicates']} in {stats['groups']} groups")
+    print(f"time:           {elapsed:.3f}s, {len(paths) / elapsed:.0f} files/s")
+
+
+if __name__ == '__main__':
+    main()
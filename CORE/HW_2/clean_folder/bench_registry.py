@@ -0,0 +1,39 @@
+import argparse
+import os
+import random
+import timeit
+
+from clean_folder.registry import registry
+
+
+NAMES = ["photo.JPG", "report.final.docx", "backup.tar.gz", "music.mp3", "notes", ".bashrc",
+         "movie.2019.mkv", "data.csv", "archive.zip", "Фото_відпустка.jpeg", "setup.tar", "dump.sql.gz"]
+
+
+def dict_lookup(name, extensions=registry.extensions):
+    # The suffix-only lookup the registry replaced, kept for comparison.
+    extension = os.path.splitext(name)[1][1:].upper()
+    return extension, extensions.get(extension, "Unknown")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time extension lookup per file name")
+    parser.add_argument("--names", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    names = random.choices(NAMES, k=args.names)
+    classify = registry.classify
+
+    for label, func in (("dict", dict_lookup), ("trie", classify)):
+        best = min(timeit.repeat(lambda: [func(name) for name in names], number=1, repeat=args.repeat))
+        print(f"{label}: {best / len(names) * 1e9:.0f} ns per name")
+
+    differ = sorted({name for name in NAMES if dict_lookup(name) != classify(name)})
+    print(f"names classified differently: {differ}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+
+from files_generator import generate_tree
+from clean_folder import clean
+from clean_folder.sniff import Sniffer
+
+
+def legacy_scan(folder, found):
+    # The recursive Path.iterdir() scan that walk() replaced, kept for comparison.
+    for item in folder.iterdir():
+        if item.is_dir():
+            if item.name not in clean.SORTED_FOLDERS:
+                legacy_scan(item, found)
+            continue
+        extension = Path(item.name).suffix[1:].upper()
+        found.append((folder / item.name, extension, clean.extension_categories.get(extension, "Unknown")))
+    return found
+
+
+def walk_scan(folder):
+    return list(clean.walk(folder))
+
+
+def sniff_scan(folder, sniffer):
+    return list(sniffer.classify_records(clean.walk(folder)))
+
+
+def measure(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy scan() with the os.scandir walker")
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / "Temp"
+        generate_tree(root, args.files, seed=args.seed)
+
+        legacy_time, legacy_count = measure(lambda: legacy_scan(root, []), repeat=args.repeat)
+        walk_time, walk_count = measure(walk_scan, root, repeat=args.repeat)
+        sniffer = Sniffer()
+        cold_time, _ = measure(sniff_scan, root, sniffer, repeat=1)
+        warm_time, _ = measure(sniff_scan, root, sniffer, repeat=args.repeat)
+
+    print(f"files: {walk_count} (legacy {legacy_count})")
+    print(f"legacy scan: {legacy_time:.4f}s, {legacy_count / legacy_time:.0f} files/s")
+    print(f"walk:        {walk_time:.4f}s, {walk_count / walk_time:.0f} files/s")
+    print(f"speedup:     x{legacy_time / walk_time:.2f}")
+    print(f"walk + sniff, cold cache: {cold_time:.4f}s, {walk_count / cold_time:.0f} files/s")
+    print(f"walk + sniff, warm cache: {warm_time:.4f}s, {walk_count / warm_time:.0f} files/s "
+          f"({sniffer.reads} header reads in total)")
+
+
+if __name__ == '__main__':
+    main()
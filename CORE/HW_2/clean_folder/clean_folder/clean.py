@@ -1,8 +1,13 @@
 
+import argparse
+import os
+from array import array
 import shutil
 import sys
 from pathlib import Path
-import re
+
+from .move import move_file, report as report_moves
+from .registry import load_registry, registry
 
 
 CYRILLIC_SYMBOLS = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяєіїґ"
@@ -15,13 +20,72 @@ for c, l in zip(CYRILLIC_SYMBOLS, TRANSLATION):
     TRANS[ord(c)] = l
     TRANS[ord(c.upper())] = l.upper()
 
+
+class NormalizeTable(dict):
+    # str.translate looks every code point up here. Anything TRANS does not
+    # cover is classified once and cached: word characters map to themselves,
+    # the rest to "_", so no regex pass is needed afterwards.
+    def __missing__(self, code):
+        char = chr(code)
+        value = char if char.isalnum() or char == "_" else "_"
+        self[code] = value
+        return value
+
+
+NORMALIZE = NormalizeTable(TRANS)
+
+
 def translate(name):
     name, *extension = name.split('.')
-    new_name = name.translate(TRANS)
-    new_name = re.sub(r'\W', "_", new_name)
+    new_name = name.translate(NORMALIZE)
     return f"{new_name}.{'.'.join(extension)}"
 
 
+def normalize_many(names, taken=()):
+    # Translates a batch of names for one folder. A name that is already taken,
+    # by an earlier name in the batch or by an existing file, gets _1, _2, ...
+    # before its extension instead of overwriting it.
+    used = set()
+    counters = {}
+    result = []
+    for name in names:
+        new_name = translate(name)
+        if new_name in used or new_name in taken:
+            stem, dot, extension = new_name.partition(".")
+            number = counters.get(new_name, 0)
+            while True:
+                number += 1
+                candidate = f"{stem}_{number}{dot}{extension}"
+                if candidate not in used and candidate not in taken:
+                    break
+            counters[new_name] = number
+            new_name = candidate
+        used.add(new_name)
+        result.append(new_name)
+    return result
+
+
+class TakenNames:
+    # Names already in a target folder, looked up one by one as a batch is
+    # named, so an unchanged tree does not list every folder on every run.
+    def __init__(self, folder):
+        self.folder = folder
+
+    def __contains__(self, name):
+        return os.path.lexists(os.path.join(self.folder, name))
+
+
+def get_taken_names(folder):
+    return TakenNames(folder)
+
+
+def get_sidecar_path(root_folder, suffix):
+    # Index, journal and sniff cache files are kept next to the root, not
+    # inside it, so scan() never sorts them.
+    root_folder = Path(root_folder).resolve()
+    return root_folder.parent / f".{root_folder.name}.clean_folder.{suffix}"
+
+
 
 image_files = list()
 document_files = list()
@@ -33,55 +97,55 @@ unknown_files = list()
 unknown = set()
 extensions = set()
 
-registered_extensions = {
-    "JPEG": image_files,
-    "PNG": image_files,
-    "JPG": image_files,
-    "SVG": image_files,
-    "TXT": document_files,
-    "DOCX": document_files,
-    "DOC": document_files,
-    "PDF": document_files,
-    "XLSX": document_files,
-    "PPTX": document_files,
-    "AVI": video_files,
-    "MP4": video_files,
-    "MOV": video_files,
-    "MKV": video_files,
-    "MP3": audio_files,
-    "OGG": audio_files,
-    "WAV": audio_files,
-    "AMR": audio_files,
-    "GZ": archive_files,
-    "TAR": archive_files,
-    "ZIP": archive_files
+categories = {
+    "Images": image_files,
+    "Documents": document_files,
+    "Videos": video_files,
+    "Audios": audio_files,
+    "Archives": archive_files,
+    "Unknown": unknown_files,
 }
 
+extension_categories = registry.extensions
+SORTED_FOLDERS = registry.folders
+MOVE_ORDER = registry.move_order
+
 
 def get_extensions(file_name):
-    return Path(file_name).suffix[1:].upper()
+    return registry.classify(file_name)[0]
 
 
-def scan(folder):
-    for item in folder.iterdir():
-        if item.is_dir():
-            if item.name not in ("Images", "Videos", "Audios", "Documents", "Archives", "Unknown"):
-                folders.append(item)
-                scan(item)
-            continue
+def walk(folder, folders=None):
+    # Iterative os.scandir walk: DirEntry caches the file type, so there is no
+    # extra stat per entry and no recursion limit on deep trees.
+    classify = registry.classify
+    stack = [os.fspath(folder)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in SORTED_FOLDERS:
+                        if folders is not None:
+                            folders.append(Path(entry.path))
+                        stack.append(entry.path)
+                    continue
+
+                yield Path(entry.path), *classify(entry.name)
+
 
-        extension = get_extensions(file_name=item.name)
-        new_name = folder/item.name
+def scan(folder, records=None):
+    if records is None:
+        records = walk(folder, folders)
+
+    for path, extension, category in records:
         if not extension:
-            unknown_files.append(new_name)
+            unknown_files.append(path)
+        elif category == "Unknown":
+            unknown.add(extension)
+            unknown_files.append(path)
         else:
-            try:
-                container = registered_extensions[extension]
-                extensions.add(extension)
-                container.append(new_name)
-            except KeyError:
-                unknown.add(extension)
-                unknown_files.append(new_name)
+            extensions.add(extension)
+            categories.setdefault(category, []).append(path)
 
 
     print(f"Images: {image_files}\n")
@@ -94,31 +158,165 @@ def scan(folder):
     print(f"Unknown extensions: {unknown}\n")
 
 
+class FileList:
+    # Read-only sequence over path ids of one category; Path objects are
+    # built only while iterating.
+    def __init__(self, sorter, ids):
+        self.sorter = sorter
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        return self.sorter.get_path(self.ids[position])
+
+    def __iter__(self):
+        get_path = self.sorter.get_path
+        return (get_path(file_id) for file_id in self.ids)
+
+
+class Sorter:
+    # One run over one root. All state lives on the instance, so a process can
+    # run any number of sorters, one after another or side by side.
+    # A file is a path id: its name plus the id of its parent folder, kept in
+    # flat arrays instead of a Path object per file.
+    def __init__(self, root_folder):
+        self.root_folder = Path(root_folder)
+        self.parents = []
+        self.parent_ids = {}
+        self.parent_of = array("L")
+        self.names = []
+        self.files = {category: array("L") for category in registry.categories}
+        self.folders = []
+        self.extensions = set()
+        self.unknown = set()
+
+    def add(self, path, category):
+        parent, name = os.path.split(path)
+        parent_id = self.parent_ids.get(parent)
+        if parent_id is None:
+            parent_id = self.parent_ids[parent] = len(self.parents)
+            self.parents.append(parent)
+        self.files[category].append(len(self.names))
+        self.parent_of.append(parent_id)
+        self.names.append(name)
+
+    def get_path(self, file_id):
+        return Path(self.parents[self.parent_of[file_id]], self.names[file_id])
+
+    def get_files(self, category):
+        return FileList(self, self.files[category])
+
+    def view(self):
+        return {category: self.get_files(category) for category in self.files}
+
+    def scan(self, records=None):
+        if records is None:
+            records = walk(self.root_folder, self.folders)
+
+        for path, extension, category in records:
+            if not extension:
+                self.add(path, "Unknown")
+            elif category == "Unknown":
+                self.unknown.add(extension)
+                self.add(path, "Unknown")
+            else:
+                self.extensions.add(extension)
+                self.add(path, category)
+        return self.view()
+
+    def report(self):
+        for category, ids in self.files.items():
+            print(f"{category}: {len(ids)}")
+        print(f"All extensions: {self.extensions}")
+        print(f"Unknown extensions: {self.unknown}")
+
+    def prune(self, kept=()):
+        # Removes the folders this run emptied, deepest first. Only folders
+        # seen by the walk are considered and rmdir is only tried on those
+        # with nothing left in them, so the cost follows the folders emptied
+        # rather than the size of the tree. kept are files that stayed put.
+        # An index walk leaves unchanged folders out; those are climbed to
+        # from a removed child instead.
+        left = {}
+        for path in kept:
+            parent = os.path.dirname(path)
+            left[parent] = left.get(parent, 0) + 1
+
+        root = os.fspath(self.root_folder)
+        folders = set(map(os.fspath, self.folders))
+        for folder in sorted(folders, key=lambda folder: folder.count(os.sep), reverse=True):
+            if not left.get(folder):
+                try:
+                    os.rmdir(folder)
+                except OSError:
+                    pass
+                else:
+                    folder = self.prune_parents(folder, root, folders)
+                    if folder is None:
+                        continue
+            parent = os.path.dirname(folder)
+            left[parent] = left.get(parent, 0) + 1
+
+        # A category folder made for archives that then failed to unpack.
+        for category in self.files:
+            try:
+                os.rmdir(self.root_folder / category)
+            except OSError:
+                pass
+
+    def prune_parents(self, folder, root, folders):
+        # Removes the emptied parents of folder that are not in folders, up
+        # to the root. Returns the first one that is still there, if any.
+        while True:
+            folder = os.path.dirname(folder)
+            if not folder or folder == root or folder in folders:
+                return None
+            try:
+                os.rmdir(folder)
+            except OSError:
+                return folder
+
+    def run(self):
+        self.prune(sort_files(self.root_folder, self.scan()))
+
+
+def get_archive_name(file_name):
+    return translate(registry.split(file_name)[0])
+
 
-def hande_file(path, root_folder, dist):
+def hande_file(path, root_folder, dist, new_name=None):
     target_folder = root_folder / dist
     target_folder.mkdir(exist_ok=True)
-    path.replace(target_folder/translate(path.name))
+    move_file(path, target_folder/(new_name or translate(path.name)))
 
 
 def handle_archive(path, root_folder, dist):
     target_folder = root_folder / dist
     target_folder.mkdir(exist_ok=True)
 
-    new_name = translate(path.name.replace(".zip", '').replace(".tar", '').replace(".gz", ''))
+    new_name = get_archive_name(path.name)
 
     archive_folder = root_folder / dist / new_name
-    archive_folder.mkdir(exist_ok=True)
+    return unpack_to(path, archive_folder)
+
+
+def unpack_to(path, archive_folder):
+    # Returns False when the archive stays where it was.
+    from .extract import ArchiveLimitError, extract_archive
 
     try:
-        shutil.unpack_archive(path, archive_folder)
+        extract_archive(path, archive_folder)
     except shutil.ReadError:
-        archive_folder.rmdir()
-        return
+        return False
     except FileNotFoundError:
-        archive_folder.rmdir()
-        return
+        return False
+    except ArchiveLimitError as error:
+        print(f"Skipped {path.name}: {error}")
+        return False
     path.unlink()
+    return True
 
 
 def remove_empty_folders(path):
@@ -140,34 +338,131 @@ def get_folder_objects(root_path):
             except OSError:
                 pass
 
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="clean-folder", description="Sort a folder by file type")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="move files in a thread pool and unpack archives in a process pool of this size")
+    parser.add_argument("--journal", action="store_true",
+                        help="write a move plan next to the folder first, then apply it; resumes after a crash")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep a directory index next to the folder and only list directories changed since the last run")
+    parser.add_argument("--sniff", action="store_true",
+                        help="detect file types from their first bytes instead of trusting the suffix")
+    parser.add_argument("--max-unpack-bytes", type=int, default=None,
+                        help="skip an archive once its unpacked size passes this many bytes")
+    parser.add_argument("--max-members", type=int, default=None,
+                        help="skip an archive that holds more members than this")
+    parser.add_argument("--no-nested", dest="nested", action="store_false",
+                        help="leave archives found inside archives packed")
+    parser.add_argument("--dedup", choices=("link", "drop"),
+                        help="replace byte-identical copies with hardlinks or delete them before sorting")
+    parser.add_argument("--extensions", type=Path,
+                        help="TOML or JSON file with extra categories or extensions, see extensions.example.toml")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only count what would be sorted and estimate how long it would take")
+    return parser.parse_args(args)
+
+
+def move_files(folder_path, files):
+    for dist in MOVE_ORDER:
+        new_names = normalize_many((file.name for file in files[dist]), get_taken_names(folder_path / dist))
+        for file, new_name in zip(files[dist], new_names):
+            hande_file(file, folder_path, dist, new_name)
+
+
+def unpack_files(folder_path, files):
+    kept = []
+    for file in files["Archives"]:
+        if not handle_archive(file, folder_path, "Archives"):
+            kept.append(file)
+    return kept
+
+
+def sort_files(folder_path, files=None):
+    files = categories if files is None else files
+    move_files(folder_path, files)
+    return unpack_files(folder_path, files)
+
+
 def main():
-    path = sys.argv[1]
-    folder_path = Path(path)
-    scan(folder_path)
+    args = parse_args()
+    folder_path = args.path
+    index = None
+    sniffer = None
+
+    if args.extensions:
+        load_registry(args.extensions)
+
+    from .extract import configure
+    configure(args.max_unpack_bytes, args.max_members, args.nested)
+
+    if args.sniff:
+        from .sniff import Sniffer
+        sniffer = Sniffer(get_sidecar_path(folder_path, "sniff"))
+
+    if args.dry_run:
+        from .estimate import dry_run
+        records = walk(folder_path)
+        if sniffer is not None:
+            records = sniffer.classify_records(records)
+        dry_run(folder_path, records)
+        if sniffer is not None:
+            sniffer.save()
+        return
 
-    for file in image_files:
-        hande_file(file, folder_path, "Images")
+    if args.incremental or args.dedup:
+        # --dedup keeps the digests of sorted files in the same database.
+        from .index import open_index
+        index = open_index(folder_path)
 
-    for file in document_files:
-        hande_file(file, folder_path, "Documents")
+    sorters = []
 
-    for file in video_files:
-        hande_file(file, folder_path, "Videos")
+    def scan_folder(folder):
+        sorter = Sorter(folder)
+        sorters.append(sorter)
+        if args.incremental:
+            from .index import walk_indexed
+            records = walk_indexed(folder, index, sorter.folders)
+        else:
+            records = walk(folder, sorter.folders)
+        if sniffer is not None:
+            records = sniffer.classify_records(records)
+        files = sorter.scan(records)
+        sorter.report()
+        if args.dedup:
+            from .dedup import dedup
+            stats = dedup(folder, files, index, args.dedup, max(args.workers, 4))
+            print(f"Duplicates: {stats['duplicates']} in {stats['groups']} groups, "
+                  f"{stats['full_hashed']} of {stats['files']} files fully hashed")
+        return files
+
+    kept = ()
+    if args.journal:
+        from .journal import run_journaled
+        run_journaled(folder_path, scan_folder)
+    else:
+        files = scan_folder(folder_path)
+        if args.workers > 1:
+            from .parallel import run_parallel
+            kept = run_parallel(folder_path, files, args.workers)
+        else:
+            kept = sort_files(folder_path, files)
 
-    for file in audio_files:
-        hande_file(file, folder_path, "Audios")
-        
-    for file in unknown_files:
-        hande_file(file, folder_path, "Unknown")
+    if sorters:
+        sorters[-1].prune(kept)
+    else:
+        # A resumed journal never walked the tree, so there is nothing recorded to prune from.
+        get_folder_objects(folder_path)
 
-    for file in archive_files:
-        handle_archive(file, folder_path, "Archives")
+    report_moves()
 
-    get_folder_objects(folder_path)
+    if index is not None:
+        index.commit()
+        index.close()
+    if sniffer is not None:
+        sniffer.save()
 
 if __name__ == '__main__':
-    path = sys.argv[1]
-    print(f"Start in {path}")
-
-    arg = Path(path)
+    print(f"Start in {sys.argv[1]}")
     main()
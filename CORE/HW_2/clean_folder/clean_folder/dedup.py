@@ -0,0 +1,204 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .clean import MOVE_ORDER, translate
+
+
+EDGE_SIZE = 64 * 1024
+
+
+def get_stat(path):
+    try:
+        return path, os.stat(path)
+    except OSError:
+        return path, None
+
+
+def partial_hash(path):
+    # First and last 64 KiB. For files up to 128 KiB this covers every byte,
+    # so the result is already a full hash.
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        digest.update(file.read(EDGE_SIZE))
+        if size > EDGE_SIZE:
+            file.seek(max(EDGE_SIZE, size - EDGE_SIZE))
+            digest.update(file.read(EDGE_SIZE))
+    return path, digest.digest()
+
+
+def full_hash(path):
+    with open(path, "rb") as file:
+        return path, hashlib.file_digest(file, lambda: hashlib.blake2b(digest_size=20)).digest()
+
+
+def split_groups(executor, func, groups):
+    # Runs func over every path of every group in one pass through the pool
+    # and splits each group by the result, dropping whatever ends up alone.
+    jobs = [(index, path) for index, group in enumerate(groups) for path in group]
+    buckets = {}
+    for (index, _), (path, key) in zip(jobs, executor.map(func, [path for _, path in jobs])):
+        buckets.setdefault((index, key), []).append(path)
+    return [bucket for bucket in buckets.values() if len(bucket) > 1]
+
+
+def cached(func, digests):
+    # Hashes only the paths without a digest yet and keeps what it computed.
+    def get(path):
+        digest = digests.get(path)
+        if digest is None:
+            digest = digests[path] = func(path)[1]
+        return path, digest
+    return get
+
+
+class Digests:
+    # Size and digests of the files already sorted, kept in the index DB, so
+    # a run only stats what it scanned. A row is keyed by inode, which a
+    # rename into a category folder keeps, and holds the name the file was
+    # sorted under to find it again.
+    def __init__(self, index, root_folder):
+        self.index = index
+        self.root_folder = Path(root_folder)
+        self.stats = {}
+        self.partial = {}
+        self.full = {}
+        self.known = {}
+
+    def add_scanned(self, path, stat):
+        self.stats[path] = stat
+        row = self.index.execute("SELECT size, mtime_ns, partial, full FROM digests WHERE dev = ? AND ino = ?",
+                                 (stat.st_dev, stat.st_ino)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            self.keep_digests(path, *row[2:])
+
+    def keep_digests(self, path, partial, full):
+        if partial is not None:
+            self.partial[path] = partial
+        if full is not None:
+            self.full[path] = full
+
+    def locate(self, dev, ino, dist, name):
+        # Under the name it was sorted with, or else anywhere in its folder.
+        path = self.root_folder / dist / name
+        try:
+            stat = os.stat(path)
+            if (stat.st_dev, stat.st_ino) == (dev, ino):
+                return path, stat
+        except OSError:
+            pass
+        try:
+            with os.scandir(path.parent) as entries:
+                for entry in entries:
+                    if entry.inode() == ino and entry.is_file():
+                        stat = entry.stat()
+                        if stat.st_dev == dev:
+                            return Path(entry.path), stat
+        except FileNotFoundError:
+            pass
+        return None, None
+
+    def find_sorted(self, size, inodes):
+        rows = self.index.execute("SELECT dev, ino, dist, name, mtime_ns, partial, full FROM digests WHERE size = ?",
+                                  (size,)).fetchall()
+        for dev, ino, dist, name, mtime_ns, partial, full in rows:
+            if (dev, ino) in inodes:
+                continue
+            path, stat = self.locate(dev, ino, dist, name)
+            if path is None or (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                # Deleted or changed since it was sorted.
+                self.index.execute("DELETE FROM digests WHERE dev = ? AND ino = ?", (dev, ino))
+                continue
+            if path.name != name:
+                self.index.execute("UPDATE digests SET name = ? WHERE dev = ? AND ino = ?", (path.name, dev, ino))
+            self.keep_digests(path, partial, full)
+            self.known[path] = dev, ino
+            yield path
+
+    def record(self, path, dist):
+        stat = self.stats[path]
+        self.index.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (stat.st_dev, stat.st_ino, dist, translate(path.name), stat.st_size, stat.st_mtime_ns,
+                            self.partial.get(path), self.full.get(path)))
+
+    def record_hashes(self):
+        for path, (dev, ino) in self.known.items():
+            self.index.execute("UPDATE digests SET partial = coalesce(partial, ?), full = coalesce(full, ?) "
+                               "WHERE dev = ? AND ino = ?", (self.partial.get(path), self.full.get(path), dev, ino))
+
+
+def find_duplicates(paths, workers=8, stats=None, digests=None):
+    # With digests, the scanned paths are also compared with every sorted
+    # file of the same size.
+    stats = {} if stats is None else stats
+    partial_digests = {} if digests is None else digests.partial
+    full_digests = {} if digests is None else digests.full
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        by_size, inodes = {}, set()
+        for path, stat in executor.map(get_stat, paths):
+            if stat is None or stat.st_size == 0:
+                continue
+            # Hardlinks of one inode are already deduplicated.
+            if (stat.st_dev, stat.st_ino) in inodes:
+                continue
+            inodes.add((stat.st_dev, stat.st_ino))
+            by_size.setdefault(stat.st_size, []).append(path)
+            if digests is not None:
+                digests.add_scanned(path, stat)
+
+        stats["files"] = len(inodes)
+        if digests is not None:
+            for size, group in by_size.items():
+                group.extend(digests.find_sorted(size, inodes))
+
+        sized = [(size, group) for size, group in by_size.items() if len(group) > 1]
+        stats["partial_hashed"] = sum(len(group) for _, group in sized)
+
+        partial = cached(partial_hash, partial_digests)
+        small = split_groups(executor, partial, [group for size, group in sized if size <= 2 * EDGE_SIZE])
+        large = split_groups(executor, partial, [group for size, group in sized if size > 2 * EDGE_SIZE])
+
+        stats["full_hashed"] = sum(map(len, large))
+        duplicates = small + split_groups(executor, cached(full_hash, full_digests), large)
+    stats["groups"] = len(duplicates)
+    stats["duplicates"] = sum(len(group) - 1 for group in duplicates)
+    return duplicates
+
+
+def link_to(original, duplicate):
+    tmp_path = duplicate.with_name(f".{duplicate.name}.link")
+    os.link(original, tmp_path)
+    os.replace(tmp_path, duplicate)
+
+
+def dedup(root_folder, categories, index, mode="link", workers=8):
+    # Scanned files are compared with each other and with what is already
+    # sorted; an already sorted copy is always the one that is kept. What
+    # this run scanned is then recorded as sorted for the next one.
+    digests = Digests(index, root_folder)
+    candidates = [(path, dist) for dist in MOVE_ORDER for path in categories[dist]]
+
+    stats = {}
+    dropped = set()
+    for group in find_duplicates([path for path, _ in candidates], workers, stats, digests):
+        group.sort(key=lambda path: path not in digests.known)
+        original, *copies = group
+        for duplicate in copies:
+            if mode == "drop":
+                duplicate.unlink()
+            else:
+                link_to(original, duplicate)
+            dropped.add(duplicate)
+
+    for path, dist in candidates:
+        # A linked copy shares the inode, and so the row, of its original.
+        if path in digests.stats and path not in dropped:
+            digests.record(path, dist)
+    digests.record_hashes()
+
+    if mode == "drop" and dropped:
+        for dist in MOVE_ORDER:
+            categories[dist] = [path for path in categories[dist] if path not in dropped]
+    return stats
@@ -0,0 +1,119 @@
+import os
+import random
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from .clean import walk
+from .registry import registry
+from .extract import extract_archive
+
+
+CALIBRATION_FILES = 500
+CALIBRATION_BYTES = 8 * 1024 * 1024
+# Deflate never compresses better than this.
+MAX_DEFLATE_RATIO = 1032
+
+
+def estimate_expanded_size(path, size):
+    # Reads only headers: the zip central directory, the tar member headers
+    # (decompressing .tar.bz2 or .tar.xz on the way) or the gzip trailer,
+    # which holds the uncompressed size modulo 4 GiB. Returns (bytes, exact);
+    # exact is False when bytes is only a lower bound.
+    try:
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                return sum(info.file_size for info in archive.infolist()), True
+        with open(path, "rb") as file:
+            magic = file.read(2)
+            if magic == b"\x1f\x8b":
+                file.seek(-4, os.SEEK_END)
+                expanded = struct.unpack("<I", file.read(4))[0]
+                # Small or incompressible data expands to less than the gzip
+                # itself, so the trailer is not wrapped unless the ratio would
+                # be impossible. Only a gzip too small to reach 4 GiB even at
+                # the best ratio is known not to have wrapped at all.
+                while size > expanded * MAX_DEFLATE_RATIO:
+                    expanded += 1 << 32
+                return expanded, size * MAX_DEFLATE_RATIO < 1 << 32
+        expanded = 0
+        with tarfile.open(path, "r|*") as archive:
+            while (member := archive.next()) is not None:
+                archive.members = []
+                expanded += member.size
+        return expanded, True
+    except (OSError, tarfile.TarError, zipfile.BadZipFile, EOFError, struct.error):
+        return 0, False
+
+
+def get_calibration_folder(root_folder):
+    # Calibrate on the filesystem being sorted when it is writable, since
+    # that is where the renames will happen.
+    try:
+        return tempfile.TemporaryDirectory(prefix=".clean_folder-calibrate-", dir=root_folder)
+    except OSError:
+        return tempfile.TemporaryDirectory(prefix="clean_folder-calibrate-")
+
+
+def calibrate(root_folder):
+    with get_calibration_folder(root_folder) as tmp:
+        tmp = Path(tmp)
+        source, target = tmp / "source", tmp / "target"
+        source.mkdir()
+        target.mkdir()
+        for number in range(CALIBRATION_FILES):
+            (source / f"{number}.txt").touch()
+
+        start = time.perf_counter()
+        for number in range(CALIBRATION_FILES):
+            os.replace(source / f"{number}.txt", target / f"{number}.txt")
+        renames_per_second = CALIBRATION_FILES / (time.perf_counter() - start)
+
+        # Half random, half repetitive, so the archive compresses like typical data.
+        random.seed(0)
+        payload = random.randbytes(CALIBRATION_BYTES // 2) + b"clean-folder " * (CALIBRATION_BYTES // 26)
+        (source / "payload.bin").write_bytes(payload)
+        archive = Path(shutil.make_archive(str(tmp / "calibration"), "gztar", source, "payload.bin"))
+
+        start = time.perf_counter()
+        extract_archive(archive, tmp / "unpacked")
+        unpack_bytes_per_second = len(payload) / (time.perf_counter() - start)
+
+    return renames_per_second, unpack_bytes_per_second
+
+
+def dry_run(root_folder, records=None):
+    # Nothing in the tree is moved; only a calibration folder is created and
+    # removed again to measure rename and unpack speed on this machine.
+    records = walk(root_folder) if records is None else records
+    totals = {category: {"files": 0, "bytes": 0, "expanded": 0, "exact": True} for category in registry.categories}
+    for path, extension, category in records:
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            continue
+        total = totals[category]
+        total["files"] += 1
+        total["bytes"] += size
+        if category == "Archives":
+            expanded, exact = estimate_expanded_size(path, size)
+            total["expanded"] += expanded
+            total["exact"] = total["exact"] and exact
+
+    renames_per_second, unpack_bytes_per_second = calibrate(root_folder)
+    moves = sum(total["files"] for category, total in totals.items() if category != "Archives")
+    expanded = totals["Archives"]["expanded"]
+    projected = moves / renames_per_second + expanded / unpack_bytes_per_second
+
+    for category, total in totals.items():
+        line = f"{category}: {total['files']} files, {total['bytes'] / 1024 ** 2:.1f} MiB"
+        if category == "Archives":
+            line += f", {'about' if total['exact'] else 'at least'} {expanded / 1024 ** 2:.1f} MiB unpacked"
+        print(line)
+    print(f"Measured: {renames_per_second:.0f} renames/s, {unpack_bytes_per_second / 1024 ** 2:.1f} MiB/s unpacking")
+    print(f"Projected runtime: {'' if totals['Archives']['exact'] else 'at least '}{projected:.1f}s")
+    return totals, projected
@@ -0,0 +1,211 @@
+import gzip
+import os
+import shutil
+import tarfile
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+
+from .clean import get_archive_name, translate
+from .registry import ARCHIVES, registry
+
+
+CHUNK_SIZE = 1024 * 1024
+MAX_DEPTH = 8
+
+settings = {
+    "max_bytes": 16 * 1024 ** 3,
+    "max_members": 100_000,
+    "nested": True,
+}
+
+
+READ_ERRORS = (tarfile.TarError, zipfile.BadZipFile, gzip.BadGzipFile, zlib.error, EOFError)
+
+
+class ArchiveLimitError(Exception):
+    pass
+
+
+def configure(max_bytes=None, max_members=None, nested=None):
+    if max_bytes is not None:
+        settings["max_bytes"] = max_bytes
+    if max_members is not None:
+        settings["max_members"] = max_members
+    if nested is not None:
+        settings["nested"] = nested
+
+
+class Budget:
+    # Shared by an archive and everything nested in it, so a zip of zips
+    # cannot multiply its way past the caps.
+    def __init__(self, max_bytes, max_members):
+        self.bytes_left = max_bytes
+        self.members_left = max_members
+        self.buffer = bytearray(CHUNK_SIZE)
+        self.view = memoryview(self.buffer)
+
+    def take_member(self, name):
+        self.members_left -= 1
+        if self.members_left < 0:
+            raise ArchiveLimitError(f"too many members, stopped at {name}")
+
+    def copy(self, source, target_path):
+        with open(target_path, "wb") as target:
+            while size := source.readinto(self.view):
+                self.bytes_left -= size
+                if self.bytes_left < 0:
+                    raise ArchiveLimitError(f"unpacked size limit reached in {target_path.name}")
+                target.write(self.view[:size])
+
+
+def normalize_member(name):
+    # Absolute paths and '..' are dropped, so a member can never land outside
+    # the target folder. Checked after translate(), which drops letters such
+    # as 'ъ' and can turn "ъ.." into "..".
+    parts = []
+    for part in PurePosixPath(name.replace("\\", "/")).parts:
+        if part in ("/", ".", ".."):
+            continue
+        normalized = translate(part)
+        normalized = normalized if "." in part else normalized[:-1]
+        if normalized in ("", ".", ".."):
+            continue
+        parts.append(normalized)
+    return Path(*parts) if parts else None
+
+
+def is_archive(name):
+    return registry.classify(name)[1] == ARCHIVES
+
+
+def get_free_target(target):
+    # Two members can normalize to the same path; the later one gets _1, _2,
+    # ... before its extension, as clashing names do when files are moved.
+    if not target.exists():
+        return target
+    stem, dot, extension = target.name.partition(".")
+    number = 1
+    while (candidate := target.with_name(f"{stem}_{number}{dot}{extension}")).exists():
+        number += 1
+    return candidate
+
+
+def open_member_target(folder, name, is_dir=False):
+    relative = normalize_member(name)
+    if relative is None:
+        return None
+    target = folder / relative
+    # Last line of defence: whatever the name was, the target stays inside.
+    if not target.resolve().is_relative_to(folder.resolve()):
+        return None
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target if is_dir else get_free_target(target)
+
+
+def extract_zip(path, folder, budget):
+    nested = []
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            budget.take_member(info.filename)
+            target = open_member_target(folder, info.filename, info.is_dir())
+            if target is None:
+                continue
+            if info.is_dir():
+                target.mkdir(exist_ok=True)
+                continue
+            with archive.open(info) as source:
+                budget.copy(source, target)
+            if is_archive(target.name):
+                nested.append(target)
+    return nested
+
+
+def extract_tar(path, folder, budget):
+    nested = []
+    # Stream mode reads the archive front to back once; the member list tarfile
+    # keeps is dropped after every header so memory does not grow with it.
+    with tarfile.open(path, mode="r|*") as archive:
+        while (member := archive.next()) is not None:
+            archive.members = []
+            budget.take_member(member.name)
+            target = open_member_target(folder, member.name, member.isdir())
+            if target is None:
+                continue
+            if member.isdir():
+                target.mkdir(exist_ok=True)
+            elif member.isfile():
+                budget.copy(archive.extractfile(member), target)
+                if is_archive(target.name):
+                    nested.append(target)
+    return nested
+
+
+def extract_gzip(path, folder, budget):
+    name = path.name[:-3] if path.name.lower().endswith(".gz") else path.name
+    target = open_member_target(folder, name)
+    budget.take_member(name)
+    with gzip.open(path) as source:
+        budget.copy(source, target)
+    return [target] if is_archive(target.name) else []
+
+
+def extract_into(path, folder, budget, depth=0):
+    if zipfile.is_zipfile(path):
+        nested = extract_zip(path, folder, budget)
+    else:
+        try:
+            nested = extract_tar(path, folder, budget)
+        except tarfile.ReadError:
+            with open(path, "rb") as file:
+                if file.read(2) != b"\x1f\x8b":
+                    raise shutil.ReadError(f"{path.name} is not an archive")
+            nested = extract_gzip(path, folder, budget)
+
+    if not settings["nested"] or depth >= MAX_DEPTH:
+        return
+    for member in nested:
+        nested_folder = member.with_name(get_archive_name(member.name))
+        existed = nested_folder.exists()
+        nested_folder.mkdir(exist_ok=True)
+        try:
+            extract_into(member, nested_folder, budget, depth + 1)
+        except (shutil.ReadError, *READ_ERRORS):
+            # Not really an archive: keep it as a plain file.
+            if not existed:
+                shutil.rmtree(nested_folder, ignore_errors=True)
+            continue
+        member.unlink()
+
+
+def merge_into(source, target):
+    with os.scandir(source) as entries:
+        for entry in entries:
+            destination = target / entry.name
+            if entry.is_dir() and destination.is_dir():
+                merge_into(Path(entry.path), destination)
+            else:
+                os.replace(entry.path, destination)
+    os.rmdir(source)
+
+
+def extract_archive(path, archive_folder):
+    # Unpacks into a hidden sibling first; archive_folder only gets the result
+    # once the whole archive made it through the caps.
+    partial = archive_folder.with_name(f".{archive_folder.name}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir()
+    budget = Budget(settings["max_bytes"], settings["max_members"])
+    try:
+        extract_into(path, partial, budget)
+    except READ_ERRORS as error:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise shutil.ReadError(str(error)) from error
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    if archive_folder.exists():
+        merge_into(partial, archive_folder)
+    else:
+        partial.rename(archive_folder)
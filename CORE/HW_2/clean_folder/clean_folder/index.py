@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from pathlib import Path
+
+from .clean import SORTED_FOLDERS, get_sidecar_path
+from .registry import registry
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    ino INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT,
+    name TEXT,
+    ino INTEGER,
+    mtime_ns INTEGER,
+    PRIMARY KEY (dir, name)
+);
+CREATE TABLE IF NOT EXISTS digests (
+    dev INTEGER,
+    ino INTEGER,
+    dist TEXT,
+    name TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    partial BLOB,
+    full BLOB,
+    PRIMARY KEY (dev, ino)
+);
+CREATE INDEX IF NOT EXISTS digests_size ON digests (size);
+"""
+
+
+def open_index(root_folder):
+    connection = sqlite3.connect(get_sidecar_path(root_folder, "db"))
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def forget_dir(index, path):
+    prefix = path + os.sep
+    index.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))
+    index.execute("DELETE FROM files WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, len(prefix), prefix))
+
+
+def list_changed_dir(index, root, path, stat):
+    # Lists one directory whose mtime/inode moved since the last run and
+    # refreshes its rows. Yields the files that were not seen there before.
+    known_dirs = {row[0] for row in index.execute("SELECT path FROM dirs WHERE parent = ?", (path,))}
+    known_files = {name: (ino, mtime_ns) for name, ino, mtime_ns in
+                   index.execute("SELECT name, ino, mtime_ns FROM files WHERE dir = ?", (path,))}
+    seen_dirs, seen_files = [], []
+
+    with os.scandir(os.path.join(root, path)) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name not in SORTED_FOLDERS:
+                    seen_dirs.append(os.path.join(path, entry.name))
+                continue
+
+            signature = (entry.inode(), entry.stat().st_mtime_ns)
+            seen_files.append((path, entry.name, *signature))
+            if known_files.get(entry.name) == signature:
+                continue
+            yield Path(entry.path), *registry.classify(entry.name)
+
+    for child in known_dirs.difference(seen_dirs):
+        forget_dir(index, child)
+    index.execute("DELETE FROM files WHERE dir = ?", (path,))
+    index.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", seen_files)
+    # The stat taken before listing is stored, so anything that lands in the
+    # directory while it is being sorted still shows up as a change next run.
+    index.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                  (path, os.path.dirname(path) if path else None, stat.st_ino, stat.st_mtime_ns))
+    return seen_dirs
+
+
+def walk_indexed(folder, index, folders=None):
+    # Same records as walk(), but a directory whose mtime and inode match the
+    # index is not listed at all: only its known subdirectories are stat'ed.
+    # Only directories that changed go into folders; prune() climbs to the
+    # unchanged parents of the ones it removes.
+    root = os.fspath(folder)
+    stack = [""]
+    while stack:
+        path = stack.pop()
+        try:
+            stat = os.stat(os.path.join(root, path))
+        except FileNotFoundError:
+            forget_dir(index, path)
+            continue
+
+        row = index.execute("SELECT ino, mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row == (stat.st_ino, stat.st_mtime_ns):
+            children = [child for child, in index.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+        else:
+            if path and folders is not None:
+                folders.append(Path(root, path))
+            children = yield from list_changed_dir(index, root, path, stat)
+        stack.extend(children)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+
+from .clean import MOVE_ORDER, get_archive_name, get_sidecar_path, get_taken_names, normalize_many, unpack_to
+from .move import move_file
+
+
+FSYNC_EVERY = 1000
+
+# Journal layout, one record per line, paths relative to the sorted root:
+#   PLAN <digest> <count>
+#   M<TAB>source<TAB>destination<TAB>stamp     move
+#   U<TAB>source<TAB>destination<TAB>stamp     unpack archive
+#   COMMIT <index>                             entry <index> has been applied
+#   FAIL <index><TAB>reason                    entry <index> failed and is skipped
+#   END                                        every entry has been applied
+# stamp is size:mtime_ns:inode of the source when the plan was made.
+
+
+def escape(path):
+    return str(path).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def unescape(text):
+    return re.sub(r"\\(.)", lambda match: {"t": "\t", "n": "\n"}.get(match[1], match[1]), text)
+
+
+def format_entry(root_folder, action, source, destination, stamp):
+    return (f"{action}\t{escape(source.relative_to(root_folder))}\t"
+            f"{escape(destination.relative_to(root_folder))}\t{stamp}\n")
+
+
+def get_stamp(path):
+    # A different file under the same name gives a different plan.
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}:{stat.st_ino}"
+
+
+def build_plan(root_folder, categories):
+    plan = []
+    for dist in MOVE_ORDER:
+        files = categories[dist]
+        new_names = normalize_many((path.name for path in files), get_taken_names(root_folder / dist))
+        for path, new_name in zip(files, new_names):
+            plan.append(("M", path, root_folder / dist / new_name, get_stamp(path)))
+    for path in categories["Archives"]:
+        plan.append(("U", path, root_folder / "Archives" / get_archive_name(path.name), get_stamp(path)))
+    return plan
+
+
+def get_digest(root_folder, plan):
+    digest = hashlib.sha1()
+    for entry in plan:
+        digest.update(format_entry(root_folder, *entry).encode())
+    return digest.hexdigest()
+
+
+def write_plan(journal_path, root_folder, plan, digest):
+    tmp_path = journal_path.with_name(journal_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as journal:
+        journal.write(f"PLAN {digest} {len(plan)}\n")
+        for entry in plan:
+            journal.write(format_entry(root_folder, *entry))
+        journal.flush()
+        os.fsync(journal.fileno())
+    os.replace(tmp_path, journal_path)
+
+
+def read_journal(journal_path, root_folder):
+    # Returns (digest, plan, next entry to apply, finished, failed) or None
+    # when there is no usable journal. A torn last line from a crash is ignored.
+    try:
+        with open(journal_path, encoding="utf-8") as journal:
+            lines = journal.read().split("\n")
+    except FileNotFoundError:
+        return None
+
+    header = lines[0].split()
+    if len(header) != 3 or header[0] != "PLAN" or not header[2].isdigit():
+        return None
+    digest, count = header[1], int(header[2])
+
+    plan = []
+    for line in lines[1:count + 1]:
+        fields = line.split("\t")
+        if len(fields) != 4:
+            return None
+        action, source, destination, stamp = fields
+        plan.append((action, root_folder / unescape(source), root_folder / unescape(destination), stamp))
+    if len(plan) != count:
+        return None
+
+    position, finished, failed = 0, False, False
+    for line in lines[count + 1:]:
+        action, _, rest = line.partition(" ")
+        index = rest.split("\t")[0]
+        if action in ("COMMIT", "FAIL") and index.isdigit():
+            position = int(index) + 1
+            failed = failed or action == "FAIL"
+        elif line == "END":
+            finished = True
+    return digest, plan, position, finished, failed
+
+
+def apply_entry(action, source, destination, stamp):
+    if not source.exists():
+        # Already applied before a crash, the commit record just did not make it.
+        return
+    if get_stamp(source) != stamp:
+        # Another file took the name after the planned one was moved; moving
+        # it now would overwrite that one at the destination.
+        print(f"Skipped {source.name}: changed since the plan was made")
+        return
+    destination.parent.mkdir(exist_ok=True)
+    if action == "M":
+        move_file(source, destination)
+    else:
+        unpack_to(source, destination)
+
+
+def apply_plan(journal_path, plan, start=0):
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        for index in range(start, len(plan)):
+            try:
+                apply_entry(*plan[index])
+            except OSError as error:
+                # Recorded and skipped, so a file that cannot be moved does
+                # not stop every later run at the same entry.
+                print(f"Failed {plan[index][1].name}: {error}")
+                journal.write(f"FAIL {index}\t{escape(error)}\n")
+                journal.flush()
+                continue
+            journal.write(f"COMMIT {index}\n")
+            journal.flush()
+            if index % FSYNC_EVERY == 0:
+                os.fsync(journal.fileno())
+        journal.write("END\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def run_journaled(root_folder, scan):
+    root_folder = root_folder.resolve()
+    journal_path = get_sidecar_path(root_folder, "journal")
+    state = read_journal(journal_path, root_folder)
+
+    if state and not state[3]:
+        digest, plan, position, _, _ = state
+        print(f"Resuming plan {digest[:12]} at entry {position} of {len(plan)}")
+        apply_plan(journal_path, plan, position)
+        return
+
+    plan = build_plan(root_folder, scan(root_folder))
+    digest = get_digest(root_folder, plan)
+    if not plan:
+        print("Nothing to sort")
+        return
+    # A plan with failed entries is tried again; they may work now.
+    if state and state[0] == digest and not state[4]:
+        print("Plan unchanged, nothing to apply")
+        return
+
+    write_plan(journal_path, root_folder, plan, digest)
+    apply_plan(journal_path, plan)
@@ -0,0 +1,161 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+LARGE_FILE = 64 * 1024 * 1024
+RANGE_SIZE = 16 * 1024 * 1024
+RANGE_WORKERS = 4
+
+counters = {}
+counters_lock = threading.Lock()
+range_pool = None
+range_pool_lock = threading.Lock()
+
+
+def record(source_dev, target_dev, size, seconds):
+    with counters_lock:
+        counter = counters.setdefault((source_dev, target_dev), {"files": 0, "bytes": 0, "seconds": 0.0})
+        counter["files"] += 1
+        counter["bytes"] += size
+        counter["seconds"] += seconds
+
+
+def get_range_pool():
+    global range_pool
+    with range_pool_lock:
+        if range_pool is None:
+            range_pool = ThreadPoolExecutor(max_workers=RANGE_WORKERS, thread_name_prefix="copy-range")
+        return range_pool
+
+
+def copy_stream(source_fd, target_fd, size):
+    # Kernel-side copy: copy_file_range where the filesystems allow it, then
+    # sendfile, and a plain read/write loop as the last resort. Returns the
+    # bytes copied. Some filesystems (procfs, some FUSE and NFS mounts)
+    # answer 0 at offset 0 instead of failing, which means "try the next
+    # method" there, as in shutil; a 0 later on is the end of the file.
+    offset = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(source_fd, target_fd, size - offset)
+                if not copied:
+                    break
+                offset += copied
+            if offset:
+                return offset
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    if not offset:
+        try:
+            while offset < size:
+                sent = os.sendfile(target_fd, source_fd, offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+            if offset:
+                return offset
+        except OSError as error:
+            if error.errno not in (errno.EINVAL, errno.ENOSYS):
+                raise
+    os.lseek(source_fd, offset, os.SEEK_SET)
+    os.lseek(target_fd, offset, os.SEEK_SET)
+    while chunk := os.read(source_fd, RANGE_SIZE):
+        os.write(target_fd, chunk)
+        offset += len(chunk)
+    return offset
+
+
+def copy_range(source_fd, target_fd, start, size):
+    # Positional copy of one range, so several ranges of one file can be
+    # copied at the same time. Returns the bytes copied; a 0 from
+    # copy_file_range at the start of the range falls back as in copy_stream.
+    offset, end = start, start + size
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < end:
+                copied = os.copy_file_range(source_fd, target_fd, end - offset, offset, offset)
+                if not copied:
+                    break
+                offset += copied
+            if offset > start:
+                return offset - start
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    while offset < end:
+        chunk = os.pread(source_fd, min(RANGE_SIZE, end - offset), offset)
+        if not chunk:
+            break
+        offset += os.pwrite(target_fd, chunk, offset)
+    return offset - start
+
+
+def copy_across(source, destination, size):
+    partial = destination.with_name(f".{destination.name}.part")
+    source_fd = os.open(source, os.O_RDONLY)
+    try:
+        target_fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if size >= LARGE_FILE:
+                os.ftruncate(target_fd, size)
+                pool = get_range_pool()
+                ranges = [pool.submit(copy_range, source_fd, target_fd, start, min(RANGE_SIZE, size - start))
+                          for start in range(0, size, RANGE_SIZE)]
+                copied = sum(future.result() for future in ranges)
+            else:
+                copied = copy_stream(source_fd, target_fd, size)
+            # The source is only removed after a complete copy.
+            if copied != size:
+                raise OSError(errno.EIO, f"Copied {copied} of {size} bytes", str(source))
+            os.fsync(target_fd)
+        finally:
+            os.close(target_fd)
+    except BaseException:
+        try:
+            os.unlink(partial)
+        except FileNotFoundError:
+            pass
+        raise
+    finally:
+        os.close(source_fd)
+
+    shutil.copystat(source, partial)
+    os.replace(partial, destination)
+    # The new directory entry has to be on disk before the source is
+    # unlinked on the other device, or a power loss can lose both.
+    folder_fd = os.open(destination.parent, os.O_RDONLY)
+    try:
+        os.fsync(folder_fd)
+    finally:
+        os.close(folder_fd)
+
+
+def move_file(source, destination):
+    # rename(2) when source and destination share a filesystem, otherwise a
+    # zero-copy transfer that is synced to disk before the source is removed.
+    try:
+        os.replace(source, destination)
+        return
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+
+    stat = os.stat(source)
+    start = time.perf_counter()
+    copy_across(source, destination, stat.st_size)
+    os.unlink(source)
+    record(stat.st_dev, os.stat(destination).st_dev, stat.st_size, time.perf_counter() - start)
+
+
+def report():
+    with counters_lock:
+        for (source_dev, target_dev), counter in counters.items():
+            speed = counter["bytes"] / counter["seconds"] / 1024 ** 2 if counter["seconds"] else 0
+            print(f"Device {source_dev} -> {target_dev}: {counter['files']} files, "
+                  f"{counter['bytes'] / 1024 ** 2:.1f} MiB, {speed:.1f} MiB/s")
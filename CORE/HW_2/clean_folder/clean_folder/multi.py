@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .clean import Sorter, hande_file, handle_archive
+from .parallel import plan_moves
+from .registry import load_registry
+
+
+def move_chunk(root_folder, moves):
+    for path, dist, new_name in moves:
+        hande_file(path, root_folder, dist, new_name)
+
+
+def unpack_chunk(root_folder, archives):
+    return [path for path in archives if not handle_archive(path, root_folder, "Archives")]
+
+
+async def run_blocking(root_limit, global_limit, func, *args):
+    # The per-root slot is taken first, so a root that is at its own cap never
+    # sits on a global slot that another root could use.
+    async with root_limit:
+        async with global_limit:
+            return await asyncio.to_thread(func, *args)
+
+
+async def sort_root(root_folder, global_limit, per_root, chunk_size):
+    start = time.perf_counter()
+    root_limit = asyncio.Semaphore(per_root)
+    sorter = Sorter(root_folder)
+
+    files = await run_blocking(root_limit, global_limit, sorter.scan)
+    moves = await run_blocking(root_limit, global_limit, plan_moves, root_folder, files)
+    await asyncio.gather(*(
+        run_blocking(root_limit, global_limit, move_chunk, root_folder, moves[start_at:start_at + chunk_size])
+        for start_at in range(0, len(moves), chunk_size)
+    ))
+    # Archives that unpack into the same folder must not race, so they stay in one chunk.
+    kept = await run_blocking(root_limit, global_limit, unpack_chunk, root_folder, list(files["Archives"]))
+    await run_blocking(root_limit, global_limit, sorter.prune, kept)
+
+    return root_folder, len(sorter.names), time.perf_counter() - start
+
+
+async def sort_roots(roots, jobs, per_root, chunk_size):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=jobs))
+    global_limit = asyncio.Semaphore(jobs)
+    tasks = [sort_root(root, global_limit, per_root, chunk_size) for root in roots]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(prog="clean-folders", description="Sort many folders in one process")
+    parser.add_argument("paths", type=Path, nargs="+")
+    parser.add_argument("--jobs", type=int, default=16, help="blocking calls in flight across all folders")
+    parser.add_argument("--per-root", type=int, default=4, help="blocking calls in flight for one folder")
+    parser.add_argument("--chunk-size", type=int, default=256, help="files moved per blocking call")
+    parser.add_argument("--extensions", type=Path, help="TOML or JSON file with extra categories or extensions")
+    return parser.parse_args(args)
+
+
+def main():
+    args = parse_args()
+    if args.extensions:
+        load_registry(args.extensions)
+    start = time.perf_counter()
+    results = asyncio.run(sort_roots(args.paths, args.jobs, args.per_root, args.chunk_size))
+    elapsed = time.perf_counter() - start
+
+    total = 0
+    for path, result in zip(args.paths, results):
+        if isinstance(result, BaseException):
+            print(f"{path}: failed: {result!r}")
+            continue
+        _, count, latency = result
+        total += count
+        print(f"{path}: {count} files in {latency:.3f}s")
+    print(f"Total: {total} files in {elapsed:.3f}s, {total / elapsed:.0f} files/s")
+
+
+if __name__ == '__main__':
+    main()
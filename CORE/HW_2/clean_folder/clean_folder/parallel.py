@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+from .clean import MOVE_ORDER, get_archive_name, get_taken_names, hande_file, handle_archive, normalize_many
+from .extract import configure, settings
+from .registry import registry
+
+
+def group_by_target(jobs):
+    # Archives that unpack into the same folder stay in one task and keep the
+    # serial order, so they merge exactly as they do in the serial run.
+    groups = {}
+    for target, job in jobs:
+        groups.setdefault(target, []).append(job)
+    return list(groups.values())
+
+
+def move_file(root_folder, job):
+    path, dist, new_name = job
+    hande_file(path, root_folder, dist, new_name)
+    return job
+
+
+def init_worker(max_bytes, max_members, nested, categories):
+    configure(max_bytes, max_members, nested)
+    registry.set_categories(categories)
+
+
+def unpack_group(root_folder, group):
+    return [(path, handle_archive(path, root_folder, "Archives")) for path in group]
+
+
+def plan_moves(root_folder, categories):
+    # Names are made unique up front, so every rename is independent.
+    moves = []
+    for dist in MOVE_ORDER:
+        files = categories[dist]
+        new_names = normalize_many((path.name for path in files), get_taken_names(root_folder / dist))
+        moves.extend(zip(files, repeat(dist), new_names))
+    return moves
+
+
+def run_parallel(root_folder, categories, workers):
+    moves = plan_moves(root_folder, categories)
+    unpacks = group_by_target(
+        (get_archive_name(path.name), path)
+        for path in categories["Archives"]
+    )
+    total = len(moves) + sum(map(len, unpacks))
+    done = 0
+    kept = []
+
+    # Renames are cheap syscalls and release the GIL, threads are enough for them.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for path, dist, new_name in executor.map(move_file, repeat(root_folder), moves):
+            done += 1
+            print(f"[{done}/{total}] {path.name} -> {dist}/{new_name}")
+
+    # Decompression is CPU-bound, so archives go to separate processes.
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(settings["max_bytes"], settings["max_members"], settings["nested"],
+                                       registry.get_config())) as executor:
+        for group in executor.map(unpack_group, repeat(root_folder), unpacks):
+            for path, unpacked in group:
+                done += 1
+                print(f"[{done}/{total}] {path.name} -> Archives")
+                if not unpacked:
+                    kept.append(path)
+    return kept
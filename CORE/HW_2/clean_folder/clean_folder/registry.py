@@ -0,0 +1,121 @@
+import json
+import tomllib
+from pathlib import Path
+
+
+ARCHIVES = "Archives"
+UNKNOWN = "Unknown"
+
+DEFAULT_CATEGORIES = {
+    "Images": ["JPEG", "PNG", "JPG", "SVG"],
+    "Documents": ["TXT", "DOCX", "DOC", "PDF", "XLSX", "PPTX"],
+    "Videos": ["AVI", "MP4", "MOV", "MKV"],
+    "Audios": ["MP3", "OGG", "WAV", "AMR"],
+    ARCHIVES: ["GZ", "TAR", "ZIP", "TAR.GZ"],
+}
+
+
+def normalize_extension(extension):
+    return extension.strip(".").upper()
+
+
+class Registry:
+    # Every suffix chain is stored reversed in a trie, so "x.tar.gz" walks
+    # GZ -> TAR and the deepest node that names a category wins. The dict,
+    # set and list below are changed in place on load, so modules that
+    # imported them see the loaded registry.
+    def __init__(self, categories=DEFAULT_CATEGORIES):
+        self.extensions = {}
+        self.folders = set()
+        self.move_order = []
+        self.trie = {}
+        self.depth = 1
+        self.categories = ()
+        self.set_categories(categories)
+
+    def set_categories(self, categories):
+        if UNKNOWN in categories:
+            raise ValueError(f"{UNKNOWN} takes every file no category matches and cannot be configured")
+        self.extensions.clear()
+        self.trie.clear()
+        self.depth = 1
+        for category, extensions in categories.items():
+            for extension in map(normalize_extension, extensions):
+                parts = extension.split(".")
+                node = self.trie
+                for part in reversed(parts):
+                    node = node.setdefault(part, {})
+                node[None] = (extension, category)
+                self.extensions[extension] = category
+                self.depth = max(self.depth, len(parts))
+
+        self.categories = (*categories, UNKNOWN)
+        self.folders.clear()
+        self.folders.update(self.categories)
+        self.move_order[:] = [category for category in self.categories if category != ARCHIVES]
+
+    def get_config(self):
+        config = {}
+        for extension, category in self.extensions.items():
+            config.setdefault(category, []).append(extension)
+        return {category: config.get(category, []) for category in self.categories if category != UNKNOWN}
+
+    def classify(self, name):
+        # Leading dots belong to the stem, as in os.path.splitext.
+        parts = name.lstrip(".").rsplit(".", self.depth)
+        found = None
+        node = self.trie
+        for depth in range(1, len(parts)):
+            node = node.get(parts[-depth].upper())
+            if node is None:
+                break
+            found = node.get(None, found)
+        if found is not None:
+            return found
+        return (parts[-1].upper() if len(parts) > 1 else ""), UNKNOWN
+
+    def split(self, name):
+        body = name.lstrip(".")
+        parts = body.rsplit(".", self.depth)
+        found, matched = None, 1
+        node = self.trie
+        for depth in range(1, len(parts)):
+            node = node.get(parts[-depth].upper())
+            if node is None:
+                break
+            if None in node:
+                found, matched = node[None], depth
+        if found is None:
+            if len(parts) == 1:
+                return name, "", UNKNOWN
+            found = (parts[-1].upper(), UNKNOWN)
+        return name[:len(name) - len(body)] + ".".join(parts[:-matched]), *found
+
+
+registry = Registry()
+
+
+def read_config(path):
+    path = Path(path)
+    with open(path, "rb") as file:
+        if path.suffix.lower() == ".toml":
+            config = tomllib.load(file)
+        else:
+            config = json.load(file)
+    if not isinstance(config.get("categories"), dict):
+        raise ValueError(f"{path} has no [categories] table")
+    return config
+
+
+def load_registry(path):
+    # Categories from the file replace the default of the same name or are
+    # added after the defaults; an extension listed in the file is taken away
+    # from whichever default category had it.
+    configured = {category: list(map(normalize_extension, extensions))
+                  for category, extensions in read_config(path)["categories"].items()}
+    claimed = {extension for extensions in configured.values() for extension in extensions}
+    categories = {category: [extension for extension in extensions if extension not in claimed]
+                  for category, extensions in DEFAULT_CATEGORIES.items()}
+    categories.update(configured)
+    registry.set_categories(categories)
+    return registry
@@ -0,0 +1,151 @@
+import os
+import pickle
+from pathlib import Path
+
+from .clean import extension_categories
+from .registry import ARCHIVES, UNKNOWN
+
+
+HEADER_SIZE = 512
+
+# (offset, magic bytes, extension); the first match wins, so longer and more
+# specific signatures go first. Signatures shorter than STRONG_MAGIC bytes
+# turn up in ordinary text ("ID3 is...") and only name files whose suffix
+# says nothing.
+STRONG_MAGIC = 4
+SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "PNG"),
+    (0, b"\xff\xd8\xff", "JPG"),
+    (0, b"%PDF-", "PDF"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "DOC"),
+    (0, b"PK\x03\x04", "ZIP"),
+    (0, b"PK\x05\x06", "ZIP"),
+    (0, b"\x1f\x8b", "GZ"),
+    (257, b"ustar", "TAR"),
+    (0, b"OggS", "OGG"),
+    (0, b"#!AMR", "AMR"),
+    (0, b"ID3", "MP3"),
+    (0, b"\xff\xfb", "MP3"),
+    (0, b"\x1a\x45\xdf\xa3", "MKV"),
+    (4, b"ftypqt", "MOV"),
+    (4, b"ftyp", "MP4"),
+)
+
+# Suffixes of plain text files, which weak signatures never reclassify even
+# when the suffix is not in any category.
+TEXT_EXTENSIONS = {"TXT", "MD", "CSV", "LOG", "JSON", "XML", "HTML", "HTM", "INI", "CFG", "YAML", "YML", "RST"}
+
+RIFF_TYPES = {b"WAVE": "WAV", b"AVI ": "AVI"}
+
+# Formats that are containers for other registered types: a .docx is a zip
+# archive on disk, so the suffix wins when it is one of these.
+CONTAINERS = {
+    "ZIP": {"DOCX", "XLSX", "PPTX"},
+    "DOC": {"XLS", "PPT"},
+}
+
+
+def is_svg(header):
+    # Only a document that opens with the svg element, after a BOM,
+    # whitespace and an optional XML declaration; not any text mentioning it.
+    text = header.removeprefix(b"\xef\xbb\xbf").lstrip()
+    if text.startswith(b"<?xml"):
+        end = text.find(b"?>")
+        if end < 0:
+            return False
+        text = text[end + 2:].lstrip()
+    return text.startswith(b"<svg")
+
+
+def match_header(header):
+    # Returns (extension, strong) or None.
+    if header[:4] == b"RIFF":
+        extension = RIFF_TYPES.get(header[8:12])
+        return (extension, True) if extension else None
+    for offset, magic, extension in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return extension, len(magic) >= STRONG_MAGIC
+    if is_svg(header):
+        return "SVG", True
+    return None
+
+
+class Sniffer:
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.cache = {}
+        self.seen = set()
+        # One buffer is reused for every header read; a Sniffer is therefore
+        # meant to be used from a single thread.
+        self.buffer = bytearray(HEADER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.reads = 0
+        if cache_path is not None:
+            self.load()
+
+    def load(self):
+        # A truncated or corrupt cache only costs the header reads it saved.
+        try:
+            with open(self.cache_path, "rb") as file:
+                cache = pickle.load(file)
+        except Exception:
+            cache = {}
+        if not isinstance(cache, dict):
+            cache = {}
+        # Entries from before signatures had a strength are sniffed again.
+        self.cache = {key: match for key, match in cache.items() if match is None or isinstance(match, tuple)}
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        # Only files met in this run are kept, so entries of deleted or
+        # sorted files do not pile up.
+        cache = {key: self.cache[key] for key in self.seen}
+        tmp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump(cache, file)
+        os.replace(tmp_path, self.cache_path)
+
+    def sniff(self, path):
+        stat = os.stat(path)
+        # Inode, size and mtime all survive a rename, so a file moved within
+        # the tree keeps its entry.
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self.seen.add(key)
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+
+        with open(path, "rb", buffering=0) as file:
+            size = file.readinto(self.view)
+        self.reads += 1
+        match = match_header(bytes(self.view[:size]))
+        self.cache[key] = match
+        return match
+
+    def classify(self, path, extension, category):
+        try:
+            match = self.sniff(path)
+        except OSError:
+            return extension, category
+        if match is None:
+            return extension, category
+        sniffed, strong = match
+        # A weak signature may only name a file whose suffix is unknown and
+        # not a text one; a registered suffix gives way to strong ones only.
+        if not strong and (category != UNKNOWN or extension in TEXT_EXTENSIONS):
+            return extension, category
+        sniffed_category = extension_categories.get(sniffed)
+        if sniffed_category is None or sniffed_category == category or extension in CONTAINERS.get(sniffed, ()):
+            return extension, category
+        # Archives are unpacked and the original removed, and .epub, .jar,
+        # .odt or .apk files are zips too; only a file without any suffix is
+        # sent there on its header alone.
+        if sniffed_category == ARCHIVES and extension:
+            return extension, category
+        return sniffed, sniffed_category
+
+    def classify_records(self, records):
+        for path, extension, category in records:
+            yield path, *self.classify(path, extension, category)
@@ -9,6 +9,8 @@ setup(
     author_email='komarov.dmytro@gmail.com',
     license='MIT',
     packages=find_packages(),
-    entry_points={"console_scripts":["clean-folder = clean_folder.clean:main"]},
+    python_requires='>=3.11',
+    entry_points={"console_scripts":["clean-folder = clean_folder.clean:main",
+                                     "clean-folders = clean_folder.multi:main"]},
     #install_requires=["numpy", "Pillow",],
 )
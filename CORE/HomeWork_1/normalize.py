@@ -1,6 +1,3 @@
-import re
-
-
 CYRILLIC_SYMBOLS = "абвгдеёжзийклмнопрстуфхцчшщъыьэюяєіїґ"
 TRANSLATION = ("a", "b", "v", "g", "d", "e", "e", "j", "z", "i", "j", "k", "l", "m", "n", "o", "p", "r", "s", "t", "u",
                "f", "h", "ts", "ch", "sh", "sch", "", "y", "", "e", "yu", "ya", "je", "i", "ji", "g")
@@ -11,8 +8,19 @@ for c, l in zip(CYRILLIC_SYMBOLS, TRANSLATION):
     TRANS[ord(c)] = l
     TRANS[ord(c.upper())] = l.upper()
 
+
+class NormalizeTable(dict):
+    def __missing__(self, code):
+        char = chr(code)
+        value = char if char.isalnum() or char == "_" else "_"
+        self[code] = value
+        return value
+
+
+NORMALIZE = NormalizeTable(TRANS)
+
+
 def translate(name):
     name, *extension = name.split('.')
-    new_name = name.translate(TRANS)
-    new_name = re.sub(r'\W', "_", new_name)
+    new_name = name.translate(NORMALIZE)
     return f"{new_name}.{'.'.join(extension)}"
\ No newline at end of file
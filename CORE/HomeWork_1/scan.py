@@ -1,3 +1,4 @@
+import os
 import sys
 from pathlib import Path
 
@@ -37,30 +38,57 @@ registered_extensions = {
 }
 
 
+categories = {
+    "Images": image_files,
+    "Documents": document_files,
+    "Videos": video_files,
+    "Audios": audio_files,
+    "Archives": archive_files,
+    "Unknown": unknown_files,
+}
+
+extension_categories = {
+    extension: category
+    for category, container in categories.items()
+    for extension, registered in registered_extensions.items()
+    if registered is container
+}
+
+SORTED_FOLDERS = frozenset(categories)
+
+
 def get_extensions(file_name):
-    return Path(file_name).suffix[1:].upper()
+    return os.path.splitext(file_name)[1][1:].upper()
+
+
+def walk(folder, folders=None):
+    # Iterative os.scandir walk: DirEntry caches the file type, so there is no
+    # extra stat per entry and no recursion limit on deep trees.
+    stack = [os.fspath(folder)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in SORTED_FOLDERS:
+                        if folders is not None:
+                            folders.append(Path(entry.path))
+                        stack.append(entry.path)
+                    continue
+
+                extension = get_extensions(entry.name)
+                yield Path(entry.path), extension, extension_categories.get(extension, "Unknown")
 
 
 def scan(folder):
-    for item in folder.iterdir():
-        if item.is_dir():
-            if item.name not in ("Images", "Videos", "Audios", "Documents", "Archives", "Unknown"):
-                folders.append(item)
-                scan(item)
-            continue
-
-        extension = get_extensions(file_name=item.name)
-        new_name = folder/item.name
+    for path, extension, category in walk(folder, folders):
         if not extension:
-            unknown_files.append(new_name)
+            unknown_files.append(path)
+        elif category == "Unknown":
+            unknown.add(extension)
+            unknown_files.append(path)
         else:
-            try:
-                container = registered_extensions[extension]
-                extensions.add(extension)
-                container.append(new_name)
-            except KeyError:
-                unknown.add(extension)
-                unknown_files.append(new_name)
+            extensions.add(extension)
+            categories[category].append(path)
 
 
 if __name__ == '__main__':
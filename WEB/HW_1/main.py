@@ -251,7 +251,7 @@ class ConsoleInterface(MyBaseClass):
 
             elif user_input == "sorter":
                 folder_path = input("Enter folder path: ")
-                self.sorter(folder_path)
+                sorter(folder_path)
 
             elif user_input == "help":
                 self.display_help()
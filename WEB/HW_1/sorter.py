@@ -1,5 +1,6 @@
-import re
+import os
 import sys
+from array import array
 from pathlib import Path
 import shutil
 
@@ -9,38 +10,29 @@ TRANSLATION = ("a", "b", "v", "g", "d", "e", "je", "zh", "z", "y", "i", "ji", "j
                "f", "h", "ts", "ch", "sh", "sch", "", "ju", "ja")
 
 TRANS = {}
-images = []
-documents = []
-audio = []
-video = []
-archives = []
-others = list()
-unknown = set()
-extensions = set()
-folders = list()
 
 registered_extensions = {
-    "JPEG": images,
-    "PNG": images,
-    "JPG": images,
-    "SVG": images,
-    'AVI':  video,
-    'MP4': video,
-    'MOV': video,
-    'MKV': video,
-    'DOC': documents,
-    'PDF': documents, 
-    'XLSX': documents, 
-    'PPTX': documents,
-    "TXT": documents,
-    "DOCX": documents,
-    'MP3': audio, 
-    'OGG': audio, 
-    'WAV': audio, 
-    'AMR': audio,
-    "ZIP": archives,
-    'GZ': archives, 
-    'TAR': archives
+    "JPEG": "IMAGES",
+    "PNG": "IMAGES",
+    "JPG": "IMAGES",
+    "SVG": "IMAGES",
+    'AVI': "VIDEO",
+    'MP4': "VIDEO",
+    'MOV': "VIDEO",
+    'MKV': "VIDEO",
+    'DOC': "DOCUMENTS",
+    'PDF': "DOCUMENTS",
+    'XLSX': "DOCUMENTS",
+    'PPTX': "DOCUMENTS",
+    "TXT": "DOCUMENTS",
+    "DOCX": "DOCUMENTS",
+    'MP3': "AUDIO",
+    'OGG': "AUDIO",
+    'WAV': "AUDIO",
+    'AMR': "AUDIO",
+    "ZIP": "ARCHIVE",
+    'GZ': "ARCHIVE",
+    'TAR': "ARCHIVE"
 }
 
 for key, value in zip(UKRAINIAN_SYMBOLS, TRANSLATION):
@@ -48,36 +40,48 @@ for key, value in zip(UKRAINIAN_SYMBOLS, TRANSLATION):
     TRANS[ord(key.upper())] = value.upper()
 
 
+class NormalizeTable(dict):
+    def __missing__(self, code):
+        char = chr(code)
+        value = char if char.isalnum() or char == "_" else "_"
+        self[code] = value
+        return value
+
+
+NORMALIZE = NormalizeTable(TRANS)
+
+
 def normalize(name):
     name, *extension = name.split('.')
-    new_name = name.translate(TRANS)
-    new_name = re.sub(r'\W', "_", new_name)
+    new_name = name.translate(NORMALIZE)
     return f"{new_name}.{'.'.join(extension)}"
 
-    
+
+CATEGORIES = ("IMAGES", "DOCUMENTS", "AUDIO", "VIDEO", "OTHERS", "ARCHIVE")
+
+SORTED_FOLDERS = frozenset(CATEGORIES) | {"OTHER"}
+
+
 def get_extensions(file_name):
-    return Path(file_name).suffix[1:].upper()
+    return os.path.splitext(file_name)[1][1:].upper()
 
-def scan(folder):
-    for item in folder.iterdir():
-        if item.is_dir():
-            if item.name not in ("DOCUMENTS", "AUDIO", "VIDEO", "ARCHIVE", "IMAGES", "OTHER"):
-                folders.append(item)
-                scan(item)
-            continue
-
-        extension = get_extensions(file_name=item.name)
-        new_name = folder/item.name
-        if not extension:
-            others.append(new_name)
-        else:
-            try:
-                container = registered_extensions[extension]
-                extensions.add(extension)
-                container.append(new_name)
-            except KeyError:
-                unknown.add(extension)
-                others.append(new_name)
+
+def walk(folder, folders=None):
+    # Iterative os.scandir walk: DirEntry caches the file type, so there is no
+    # extra stat per entry and no recursion limit on deep trees.
+    stack = [os.fspath(folder)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in SORTED_FOLDERS:
+                        if folders is not None:
+                            folders.append(Path(entry.path))
+                        stack.append(entry.path)
+                    continue
+
+                extension = get_extensions(entry.name)
+                yield Path(entry.path), extension, registered_extensions.get(extension, "OTHERS")
 
 
 
@@ -126,29 +130,79 @@ def get_folder_objects(root_path):
             except OSError:
                 pass
 
-def sorter(dir_path):
-    print(f"Start in {dir_path}")
-
-    folder_path = Path(dir_path)
-    
-    scan(folder_path)
-    for file in images:
-        hande_file(file, folder_path, "IMAGES")
-
-    for file in documents:
-        hande_file(file, folder_path, "DOCUMENTS")
-
-    for file in audio:
-        hande_file(file, folder_path, "AUDIO")
-
-    for file in video:
-        hande_file(file, folder_path, "VIDEO")
-
-    for file in others:
-        hande_file(file, folder_path, "OTHERS")
-
-    for file in archives:
-        handle_archive(file, folder_path, "ARCHIVE")
+class Sorter:
+    # Everything one run finds lives on the instance, so the sorter command
+    # can run again, or for another folder at the same time, without picking
+    # up files from an earlier run. A file is kept as the index of its parent
+    # folder plus its name, not as a Path object.
+    def __init__(self, dir_path):
+        self.folder_path = Path(dir_path)
+        self.parents = []
+        self.parent_ids = {}
+        self.parent_of = array("L")
+        self.names = []
+        self.files = {category: array("L") for category in CATEGORIES}
+        self.folders = []
+        self.extensions = set()
+        self.unknown = set()
+
+    def add(self, path, category):
+        parent, name = os.path.split(path)
+        parent_id = self.parent_ids.get(parent)
+        if parent_id is None:
+            parent_id = self.parent_ids[parent] = len(self.parents)
+            self.parents.append(parent)
+        self.files[category].append(len(self.names))
+        self.parent_of.append(parent_id)
+        self.names.append(name)
+
+    def get_files(self, category):
+        for file_id in self.files[category]:
+            yield Path(self.parents[self.parent_of[file_id]], self.names[file_id])
+
+    def scan(self):
+        for path, extension, category in walk(self.folder_path, self.folders):
+            if not extension:
+                self.add(path, "OTHERS")
+            elif category == "OTHERS":
+                self.unknown.add(extension)
+                self.add(path, "OTHERS")
+            else:
+                self.extensions.add(extension)
+                self.add(path, category)
+
+    def run(self):
+        self.scan()
+        for category in CATEGORIES:
+            for file in self.get_files(category):
+                if category == "ARCHIVE":
+                    handle_archive(file, self.folder_path, category)
+                else:
+                    hande_file(file, self.folder_path, category)
+
+        self.prune()
+
+    def prune(self):
+        # Only the folders the walk went through can have been emptied, so
+        # there is no second pass over the tree: they are removed deepest
+        # first and a failed rmdir keeps the parent as well.
+        left = set()
+        for folder in sorted(map(os.fspath, self.folders), key=lambda folder: folder.count(os.sep), reverse=True):
+            if folder not in left:
+                try:
+                    os.rmdir(folder)
+                    continue
+                except OSError:
+                    pass
+            left.add(os.path.dirname(folder))
+
+        for category in CATEGORIES:
+            try:
+                os.rmdir(self.folder_path / category)
+            except OSError:
+                pass
 
-    get_folder_objects(folder_path)
 
+def sorter(dir_path):
+    print(f"Start in {dir_path}")
+    Sorter(dir_path).run()
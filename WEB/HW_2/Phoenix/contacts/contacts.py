@@ -1,8 +1,12 @@
-from collections import UserDict
-from datetime import datetime
+from bisect import bisect_left, bisect_right, insort
+from collections import UserDict, defaultdict
+from datetime import date, datetime
 from contextlib import suppress
+import os
 import re
 import pickle
+import struct
+import zlib
 
 class Field:
     def __init__(self, value):
@@ -153,29 +157,289 @@ class Birthday(Field):
             raise ValueError("Invalid birthday format")
         self._value = new_birthday
 
+class SearchIndex:
+    # Contact names by every substring of up to GRAM_SIZE characters of the
+    # name and of each phone, by phone prefix and suffix, and by lowercase
+    # email. Longer queries intersect the sets of their grams and only those
+    # candidates are checked.
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self.name_grams = defaultdict(set)
+        self.phone_grams = defaultdict(set)
+        self.phone_prefixes = defaultdict(set)
+        self.phone_suffixes = defaultdict(set)
+        self.emails = defaultdict(set)
+        self.entries = {}
+
+    @classmethod
+    def get_grams(cls, text):
+        return {text[start:start + size] for size in range(1, cls.GRAM_SIZE + 1) for start in range(len(text) - size + 1)}
+
+    @staticmethod
+    def get_affixes(phone):
+        return [phone[:end] for end in range(1, len(phone) + 1)], [phone[-end:] for end in range(1, len(phone) + 1)]
+
+    def add(self, name, record):
+        self.remove(name)
+        # What was indexed is kept, so remove() still works after the record changed.
+        phones = tuple(phone.value for phone in record.phones)
+        emails = tuple(str(email).lower() for email in record.emails)
+        self.entries[name] = (phones, emails)
+        for gram in self.get_grams(name):
+            self.name_grams[gram].add(name)
+        for phone in phones:
+            for gram in self.get_grams(phone):
+                self.phone_grams[gram].add(name)
+            prefixes, suffixes = self.get_affixes(phone)
+            for prefix in prefixes:
+                self.phone_prefixes[prefix].add(name)
+            for suffix in suffixes:
+                self.phone_suffixes[suffix].add(name)
+        for email in emails:
+            self.emails[email].add(name)
+
+    def remove(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+        phones, emails = entry
+        self.discard(self.name_grams, self.get_grams(name), name)
+        for phone in phones:
+            self.discard(self.phone_grams, self.get_grams(phone), name)
+            prefixes, suffixes = self.get_affixes(phone)
+            self.discard(self.phone_prefixes, prefixes, name)
+            self.discard(self.phone_suffixes, suffixes, name)
+        self.discard(self.emails, emails, name)
+
+    @staticmethod
+    def discard(index, keys, name):
+        for key in keys:
+            names = index.get(key)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del index[key]
+
+    def lookup(self, grams, query, get_texts):
+        if len(query) <= self.GRAM_SIZE:
+            return set(grams.get(query, ()))
+        postings = sorted((grams.get(query[start:start + self.GRAM_SIZE], set())
+                           for start in range(len(query) - self.GRAM_SIZE + 1)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return {name for name in candidates if any(query in text for text in get_texts(name))}
+
+    def search(self, query):
+        # Ranked: exact name, phone or email first, then name and phone
+        # prefixes, phone suffixes, and anything else containing the query.
+        if not query:
+            return sorted(self.entries)
+        ranks = {}
+
+        def rank(names, score):
+            for name in names:
+                if score < ranks.get(name, score + 1):
+                    ranks[name] = score
+
+        for name in self.lookup(self.name_grams, query, lambda name: (name,)):
+            rank((name,), 0 if name == query else 1 if name.startswith(query) else 3)
+        for name in self.lookup(self.phone_grams, query, lambda name: self.entries[name][0]):
+            rank((name,), 0 if query in self.entries[name][0] else 3)
+        rank(self.phone_prefixes.get(query, ()), 1)
+        rank(self.phone_suffixes.get(query, ()), 2)
+        rank(self.emails.get(query.lower(), ()), 0)
+        return sorted(ranks, key=lambda name: (ranks[name], name))
+
+
+def write_file(path, data):
+    # Readers see either the old file or the whole new one, even after a crash.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    with suppress(OSError):
+        folder = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(folder)
+        finally:
+            os.close(folder)
+
+
+class Journal:
+    # Contact changes appended after the snapshot. Each entry is its length,
+    # its crc32 and a pickled (name, record), record None for a delete.
+    # Entries hold whole records, so replaying one twice does no harm.
+    HEADER = struct.Struct("<II")
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+
+    def read(self):
+        entries = []
+        try:
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            self.size = 0
+            return entries
+        position = 0
+        while position + self.HEADER.size <= len(data):
+            length, checksum = self.HEADER.unpack_from(data, position)
+            start = position + self.HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            entries.append(pickle.loads(payload))
+            position = start + length
+        if position < len(data):
+            # A write cut short by a crash; later entries go after the last good one.
+            with open(self.path, 'r+b') as file:
+                file.truncate(position)
+                os.fsync(file.fileno())
+        self.size = position
+        return entries
+
+    def append(self, entries):
+        frames = []
+        for entry in entries:
+            payload = pickle.dumps(entry)
+            frames.append(self.HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        data = b"".join(frames)
+        with open(self.path, 'ab') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        self.size += len(data)
+
+    def clear(self):
+        write_file(self.path, b"")
+        self.size = 0
+
+
+def get_birthday_key(name, record):
+    if not record.birthday:
+        return None
+    year, month, day = str(record.birthday).split("-")
+    return int(month), int(day), name
+
+
 class AddressBook(UserDict):
+    ORDERS = ("name", "birthday")
+    # The journal is folded into the snapshot once it outgrows both this
+    # and the snapshot, so rewriting the book stays rare as it grows.
+    COMPACT_BYTES = 1024 * 1024
+
     def __init__(self, file_path = "contact_book.bin"):
         super().__init__()
+        self.index = SearchIndex()
+        # Names in order and (month, day, name) of every birthday in order,
+        # kept sorted on every change so pages never sort the book.
+        self.by_name = []
+        self.by_birthday = []
+        self.birthday_keys = {}
+        self.changed = set()
         self.file_path = file_path
+        self.journal = Journal(f"{file_path}.log")
+        self.snapshot_size = 0
         self.load_data()
         self.page_size = 10  
 
-    def iterator(self):
-        page = 0  
-        while page * self.page_size < len(self.data):
-            start = page * self.page_size
-            end = (page + 1) * self.page_size
-            yield list(self.data.values())[start:end]
-            page += 1
+    def get_segments(self, cursor, order, today):
+        if order == "name":
+            return [(bisect_right(self.by_name, cursor) if cursor is not None else 0, len(self.by_name))]
+        # Birthdays run from today to the end of the year and wrap round to
+        # the ones before today. A cursor before today is past the wrap.
+        anchor = (today.month, today.day)
+        split = bisect_left(self.by_birthday, anchor)
+        if cursor is None:
+            return [(split, len(self.by_birthday)), (0, split)]
+        position = bisect_right(self.by_birthday, tuple(cursor))
+        if tuple(cursor[:2]) >= anchor:
+            return [(position, len(self.by_birthday)), (0, split)]
+        return [(position, split)]
+
+    def page(self, cursor=None, size=None, order="name", today=None):
+        # Returns [(name, record), ...] after cursor and the cursor of the
+        # next page, None after the last one. A cursor is the key of the last
+        # row: the name, or (month, day, name) for birthdays. Rows added or
+        # removed meanwhile do not shift the pages that follow. Birthday
+        # pages of one walk should get the same today.
+        if order not in self.ORDERS:
+            raise ValueError(f"order must be one of {self.ORDERS}")
+        size = size or self.page_size
+        keys = self.by_name if order == "name" else self.by_birthday
+        segments = self.get_segments(cursor, order, today or date.today())
+        rows = []
+        for start, stop in segments:
+            rows.extend(keys[start:min(stop, start + size - len(rows))])
+        names = rows if order == "name" else [key[2] for key in rows]
+        remaining = sum(stop - start for start, stop in segments)
+        next_cursor = rows[-1] if rows and remaining > len(rows) else None
+        return [(name, self.data[name]) for name in names], next_cursor
+
+    def iterator(self, order="name", cursor=None):
+        today = date.today()
+        while True:
+            rows, cursor = self.page(cursor, order=order, today=today)
+            if rows:
+                yield [record for _, record in rows]
+            if cursor is None:
+                break
+
+    def __setitem__(self, name, record):
+        if name not in self.data:
+            insort(self.by_name, name)
+        self.data[name] = record
+        self.changed.add(name)
+        self.index.add(name, record)
+        self.update_birthday(name, record)
+
+    def __delitem__(self, name):
+        del self.data[name]
+        del self.by_name[bisect_left(self.by_name, name)]
+        self.changed.add(name)
+        self.index.remove(name)
+        self.update_birthday(name, None)
+
+    def update_birthday(self, name, record):
+        old = self.birthday_keys.pop(name, None)
+        if old is not None:
+            del self.by_birthday[bisect_left(self.by_birthday, old)]
+        new = get_birthday_key(name, record) if record is not None else None
+        if new is not None:
+            self.birthday_keys[name] = new
+            insort(self.by_birthday, new)
+
+    def reindex(self, name):
+        # For changes made on a record directly rather than through the book.
+        if name in self.data:
+            self.changed.add(name)
+            self.index.add(name, self.data[name])
+            self.update_birthday(name, self.data[name])
+
+    def rebuild_index(self):
+        self.index = SearchIndex()
+        for name, record in self.data.items():
+            self.index.add(name, record)
+        self.by_name = sorted(self.data)
+        self.birthday_keys = {}
+        for name, record in self.data.items():
+            key = get_birthday_key(name, record)
+            if key is not None:
+                self.birthday_keys[name] = key
+        self.by_birthday = sorted(self.birthday_keys.values())
 
     def add_record(self, record):
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
     def edit_name(self, old_name, new_name):
         if old_name in self.data:
-            record = self.data.pop(old_name)
+            record = self.pop(old_name)
             record.edit_name(new_name)
-            self.data[new_name] = record
+            self[new_name] = record
         else:
             print(f"Contact {old_name.title()} not found.")
     
@@ -185,13 +449,14 @@ class AddressBook(UserDict):
 
     def delete(self, name):
         if name in self.data:
-            del self.data[name]
+            del self[name]
     
     def add_birthday(self, name, birthday):
         if name in self.data:
             try:
                 birthday_obj = Birthday(birthday)  
                 self.data[name].set_birthday(birthday_obj)
+                self.reindex(name)
                 print(f"Birthday added for {name.title()}.")
             except ValueError as e:
                 print(f"Error: {e}")
@@ -203,6 +468,7 @@ class AddressBook(UserDict):
             raise ValueError("Invalid email format")
         elif name in self.data:
             self.data[name].set_email(email)
+            self.reindex(name)
             print(f"Email added for {name.title()}.")
         else:
             print(f"Contact {name.title()} not found.")
@@ -215,56 +481,74 @@ class AddressBook(UserDict):
                 if old_contact_email in record.emails:
                     self.data[name].set_email(new_contact_email)
                     self.data[name].remove_email(old_contact_email)
+                    self.reindex(name)
         else: 
             print(f"Contact {name.title()} not found.")
 
     def add_address(self, name, address):
         if name in self.data:
             self.data[name].set_address(address)
+            self.changed.add(name)
             print(f"Address added for {name.title()}.")
         else:
             print(f"Contact {name.title()} not found.")
     
     def edit_address(self, name, new_address):
         self.data[name].set_address(new_address)
+        self.changed.add(name)
 
     def edit_birthday(self, name, new_birthday):
         if not Birthday.validate_birthday(new_birthday):
             raise ValueError("Invalid birthday format")
         self.data[name].set_birthday(new_birthday)
+        self.reindex(name)
 
     def load_data(self):
-        try:
-            with suppress(FileNotFoundError):
-                with open(self.file_path, 'rb') as file:
-                    data = pickle.load(file)
-                self.data = data
-        except FileNotFoundError:
-            print(f"File not found.")
+        with suppress(FileNotFoundError):
+            with open(self.file_path, 'rb') as file:
+                self.data = pickle.load(file)
+                self.snapshot_size = file.tell()
+        for name, record in self.journal.read():
+            if record is None:
+                self.data.pop(name, None)
+            else:
+                self.data[name] = record
+        self.rebuild_index()
+        self.changed.clear()
 
     def save_data(self):
-        with open(self.file_path, 'wb') as file:
-            pickle.dump(self.data, file)
-            print(f"Saved data to {self.file_path}")
+        # Only contacts changed since the last save are written.
+        if not self.changed:
+            return
+        self.journal.append([(name, self.data.get(name)) for name in self.changed])
+        self.changed.clear()
+        print(f"Saved data to {self.file_path}")
+        if self.journal.size > max(self.COMPACT_BYTES, self.snapshot_size):
+            self.compact()
+
+    def compact(self):
+        # A crash between the two steps leaves entries the snapshot already
+        # has, and replaying them changes nothing.
+        data = pickle.dumps(self.data)
+        write_file(self.file_path, data)
+        self.snapshot_size = len(data)
+        self.journal.clear()
 
     def __del__(self):
         self.save_data() 
 
     def search(self, query):
-        matching_contacts = []
-        for name, record in self.data.items():
-            if query in name or any(query in phone.value for phone in record.phones):
-                matching_contacts.append((name, [phone._value for phone in record.phones]))
-
-        if matching_contacts:
-            for name, phones in matching_contacts:
-                print(f"Name: {name}, Phone: {phones}")
+        names = self.index.search(query)
+        if names:
+            for name in names:
+                print(f"Name: {name}, Phone: {[phone._value for phone in self.data[name].phones]}")
         else:
             print("No matching contacts found.")
+        return [self.data[name] for name in names]
 
     def delete_contact(self, name):
         if name in self.data:
-            del self.data[name]
+            del self[name]
             return f"Contact {name.title()} has been deleted."
         else:
             return f"Contact {name.title()} not found."
@@ -301,13 +585,13 @@ class AddressBook(UserDict):
         if not Phone.validate_phone_number(phone):
             return "Invalid phone number format"
 
-        self.data[name] = Record(phone)
+        self[name] = Record(phone)
         return f"Added {name.title()} with phone {phone}"
 
     @input_error
     def change_contact(self, name, phone):
         if name in self.data:
-            self.data[name] = Record(phone)
+            self[name] = Record(phone)
             return f"Changed phone for {name.title()} to {phone}"
         else:
             return f"Contact {name.title()} not found"
@@ -173,7 +173,26 @@ if __name__ == '__main__':
     arg = Path(path)
     
     logging.basicConfig(level=logging.DEBUG, format='%(threadName)s %(message)s')
+    scan(arg)
+
+    jobs = [(file, "Images") for file in image_files] + \
+           [(file, "Documents") for file in document_files] + \
+           [(file, "Videos") for file in video_files] + \
+           [(file, "Audios") for file in audio_files] + \
+           [(file, "Unknown") for file in unknown_files]
+
+    def move(job):
+        file, dist = job
+        hande_file(file, arg, dist)
+        logging.debug(f"{file.name} -> {dist}")
+        return file
+
     with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        results = list(executor.map(main(), ))
+        results = list(executor.map(move, jobs))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        results += list(executor.map(handle_archive, archive_files,
+                                     [arg] * len(archive_files), ["Archives"] * len(archive_files)))
 
+    get_folder_objects(arg)
     logging.debug(results)
\ No newline at end of file
@@ -25,15 +25,372 @@
 
 #===============================Asynchronous version==========================#
 
+import argparse
+import atexit
+import heapq
+import os
+import pickle
+import sqlite3
+import threading
 import time
 import logging
-from multiprocessing import Pool, cpu_count, current_process
+import random
+from array import array
+from collections import OrderedDict
+from functools import partial
+from math import gcd, isqrt
+from multiprocessing import Pool, cpu_count, current_process, resource_tracker, shared_memory
+from multiprocessing.pool import ThreadPool
+
+import numpy
 
 logger = logging.getLogger()
 stream_handler = logging.StreamHandler()
 logger.addHandler(stream_handler)
 logger.setLevel(logging.DEBUG)
 
+# Numbers up to this bound are factorized from the smallest-prime-factor
+# table, bigger ones with Pollard rho. The table takes 4 bytes per number.
+SIEVE_LIMIT = 10 ** 7
+SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+sieve = None
+own_tracker = None
+
+
+class FactorCache:
+    # Factorizations of numbers above the sieve, least recently used first.
+    # With a path, misses fall through to an SQLite table that every process
+    # and every run shares; new entries are written by flush().
+    def __init__(self, maxsize=65536, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.connection = None
+        self.pid = None
+        self.hits = self.disk_hits = self.misses = 0
+
+    def connect(self):
+        # One connection per process: an SQLite handle must not cross a fork.
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS factors (n TEXT PRIMARY KEY, factors TEXT NOT NULL)")
+            self.pid = os.getpid()
+        return self.connection
+
+    def remember(self, n, factors):
+        self.entries[n] = factors
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def peek(self, n):
+        # Memory only, and a miss is not counted.
+        with self.lock:
+            factors = self.entries.get(n)
+            if factors is not None:
+                self.entries.move_to_end(n)
+                self.hits += 1
+            return factors
+
+    def get(self, n):
+        factors = self.peek(n)
+        if factors is not None:
+            return factors
+        with self.lock:
+            if self.path is not None:
+                row = self.connect().execute("SELECT factors FROM factors WHERE n = ?", (str(n),)).fetchone()
+                if row is not None:
+                    factors = tuple(tuple(map(int, pair.split("^"))) for pair in row[0].split(","))
+                    self.remember(n, factors)
+                    self.disk_hits += 1
+                    return factors
+            self.misses += 1
+            return None
+
+    def put(self, n, factors, store=True):
+        with self.lock:
+            self.remember(n, factors)
+            if store and self.path is not None:
+                self.pending.append((str(n), ",".join(f"{p}^{exponent}" for p, exponent in factors)))
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            with self.connect() as connection:
+                connection.executemany("INSERT OR IGNORE INTO factors VALUES (?, ?)", self.pending)
+            self.pending.clear()
+
+    def counters(self):
+        return self.hits, self.disk_hits, self.misses
+
+    def info(self):
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.entries)}
+
+
+cache = FactorCache()
+atexit.register(cache.flush)
+
+
+def configure(sieve_limit=None, cache_size=None, cache_path=None):
+    global SIEVE_LIMIT, sieve, cache
+    if sieve_limit is not None and sieve_limit != SIEVE_LIMIT:
+        SIEVE_LIMIT = sieve_limit
+        sieve = None
+    if cache_size is not None or cache_path is not None:
+        cache.flush()
+        atexit.unregister(cache.flush)
+        cache = FactorCache(cache.maxsize if cache_size is None else cache_size, cache_path or cache.path)
+        atexit.register(cache.flush)
+
+
+def reset_cache():
+    configure(cache_size=cache.maxsize)
+
+
+def get_settings():
+    return SIEVE_LIMIT, cache.maxsize, cache.path
+
+
+def build_sieve(limit):
+    # spf[n] is the smallest prime factor of n. Every entry starts as n itself;
+    # crossing off multiples of p in increasing order leaves the first prime
+    # that reached an entry there.
+    spf = numpy.arange(limit + 1, dtype=numpy.uint32)
+    for p in range(2, isqrt(limit) + 1):
+        if spf[p] == p:
+            multiples = spf[p * p::p]
+            numpy.minimum(multiples, p, out=multiples)
+    return spf
+
+
+def get_sieve():
+    global sieve
+    if sieve is None:
+        sieve = build_sieve(SIEVE_LIMIT)
+    return sieve
+
+
+def is_prime(n):
+    # Miller-Rabin with the first 12 primes as bases is exact below 3.3 * 10**24.
+    if n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in SMALL_PRIMES:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def pollard_rho(n):
+    # Brent's variant; returns a non-trivial factor of an odd composite n.
+    while True:
+        y, c, m = random.randrange(1, n), random.randrange(1, n), 128
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+        if g != n:
+            return g
+
+
+def add_factors(n, factors):
+    if n <= SIEVE_LIMIT:
+        spf = get_sieve()
+        while n > 1:
+            p = int(spf[n])
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+        return
+    # Every piece above the sieve is cached, so a number that shares a big
+    # factor with an earlier one is put together from the cached pieces.
+    cached = cache.get(n)
+    if cached is None:
+        found = {}
+        add_large_factors(n, found)
+        cached = tuple(sorted(found.items()))
+        cache.put(n, cached)
+    for p, exponent in cached:
+        factors[p] = factors.get(p, 0) + exponent
+
+
+def add_large_factors(n, factors):
+    for p in SMALL_PRIMES:
+        while n % p == 0:
+            factors[p] = factors.get(p, 0) + 1
+            n //= p
+    if n == 1:
+        return
+    if is_prime(n):
+        factors[n] = factors.get(n, 0) + 1
+        return
+    d = pollard_rho(n)
+    add_factors(d, factors)
+    add_factors(n // d, factors)
+
+
+def factorize(n):
+    # Prime factorization of n as sorted (prime, exponent) pairs.
+    factors = {}
+    if n > 1:
+        add_factors(n, factors)
+    return sorted(factors.items())
+
+
+def get_divisors(factors):
+    divisors = [1]
+    for p, exponent in factors:
+        divisors += [d * p ** k for k in range(1, exponent + 1) for d in divisors]
+    divisors.sort()
+    return divisors
+
+
+def divisors(n):
+    return get_divisors(factorize(n)) if n > 0 else []
+
+
+INT64_MAX = 2 ** 63 - 1
+BACKENDS = ("serial", "thread", "process")
+CHUNKS_PER_WORKER = 4
+
+
+def estimate_cost(n):
+    # Inside the sieve a number costs a few steps per prime factor; above it
+    # Pollard rho needs about n ** 0.25 steps.
+    if n <= SIEVE_LIMIT:
+        return n.bit_length()
+    return max(n.bit_length(), isqrt(isqrt(n)))
+
+
+def plan_chunks(items, chunks):
+    # Longest-first: every (position, n) goes to the chunk with the least
+    # cost so far, so one huge n does not end up next to a pile of others.
+    heap = [(0, index, []) for index in range(chunks)]
+    for cost, position, n in sorted(((estimate_cost(n), position, n) for position, n in items), reverse=True):
+        total, index, chunk = heapq.heappop(heap)
+        chunk.append((position, n))
+        heapq.heappush(heap, (total + cost, index, chunk))
+    return [chunk for _, _, chunk in heap if chunk]
+
+
+def calculate_chunk(chunk, learn=False):
+    # Divisors of every number in the chunk packed into flat int64 arrays:
+    # the divisors of positions[i] are values[offsets[i]:offsets[i + 1]].
+    # With learn, factorizations above the sieve are sent back as well, so a
+    # parent that outlives its pool can answer them itself next time.
+    before = cache.counters()
+    positions, offsets, values = array("q"), array("q", [0]), array("q")
+    learned = []
+    for position, n in chunk:
+        factors = factorize(n)
+        positions.append(position)
+        if n > 0:
+            values.extend(get_divisors(factors))
+        offsets.append(len(values))
+        if learn and n > SIEVE_LIMIT:
+            learned.append((n, tuple(factors)))
+    cache.flush()
+    return positions, offsets, values, get_counts(before), learned
+
+
+def get_counts(before):
+    return tuple(after - old for after, old in zip(cache.counters(), before))
+
+
+def divisors_batch(numbers, backend="process", workers=None, stats=None):
+    # Returns the divisors of every number as an array("q"), in input order.
+    # stats gets the cache hits and misses of every worker added up.
+    numbers = list(numbers)
+    if any(n > INT64_MAX for n in numbers):
+        raise ValueError("divisors_batch works on int64, use divisors() for bigger numbers")
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    workers = 1 if backend == "serial" else workers or cpu_count()
+    results = [None] * len(numbers)
+
+    if backend == "serial":
+        chunks = plan_chunks(enumerate(numbers), 1)
+        collect(map(calculate_chunk, chunks), results, stats)
+        return results
+    if backend == "thread":
+        chunks = plan_chunks(enumerate(numbers), min(len(numbers), workers * CHUNKS_PER_WORKER) or 1)
+        # Threads share one cache, so per-chunk counts would overlap.
+        before = cache.counters()
+        with ThreadPool(processes=workers) as pool:
+            collect(pool.imap_unordered(calculate_chunk, chunks), results)
+        add_counts(stats, get_counts(before))
+        return results
+
+    # Pool workers start with an empty cache, so whatever this process
+    # already knows is expanded here and never sent out.
+    before = cache.counters()
+    remote = []
+    for position, n in enumerate(numbers):
+        factors = cache.peek(n) if n > SIEVE_LIMIT else None
+        if factors is None:
+            remote.append((position, n))
+        else:
+            results[position] = array("q", get_divisors(factors))
+    add_counts(stats, get_counts(before))
+    if remote:
+        chunks = plan_chunks(remote, min(len(remote), workers * CHUNKS_PER_WORKER))
+        with get_pool(workers) as pool:
+            collect(pool.imap_unordered(partial(calculate_chunk, learn=True), chunks), results, stats)
+    return results
+
+
+def get_pool(workers):
+    # Workers get the sieve bound and cache settings of this process.
+    return Pool(processes=workers, initializer=configure, initargs=get_settings())
+
+
+def add_counts(stats, counts):
+    if stats is not None:
+        for key, count in zip(("hits", "disk_hits", "misses"), counts):
+            stats[key] = stats.get(key, 0) + count
+
+
+def collect(parts, results, stats=None):
+    for positions, offsets, values, counts, learned in parts:
+        for index, position in enumerate(positions):
+            results[position] = values[offsets[index]:offsets[index + 1]]
+        add_counts(stats, counts)
+        # The workers already wrote these to the disk cache.
+        for n, factors in learned:
+            cache.put(n, factors, store=False)
+
+
 start = time.perf_counter()
 
 def  calculating(*numbers):
@@ -41,20 +398,313 @@ def  calculating(*numbers):
     print(numbers)
     logger.debug(f"pid={current_process().pid}, results = {total_results}")
     for n in numbers:
-        result = list()
-        for i in range(1, n+1):
-            if n%i == 0:
-                result.append(i)
-        total_results.append(result)
+        total_results.append(divisors(n))
     return total_results
 
 stop = time.perf_counter()
 print(f'Calculating time = {stop-start}')
 
+def factorize_chunk(chunk):
+    # First pass of divisors_shared: factorizations and divisor counts only,
+    # which is all the parent needs to lay the shared block out.
+    before = cache.counters()
+    items = []
+    for position, n in chunk:
+        factors = factorize(n) if n > 0 else None
+        count = 0
+        if factors is not None:
+            count = 1
+            for _, exponent in factors:
+                count *= exponent + 1
+        items.append((position, count, factors))
+    cache.flush()
+    return items, get_counts(before)
+
+
+def has_own_tracker():
+    # Attaching registers the block with this process's resource tracker.
+    # Workers forked before the parent started a tracker start their own,
+    # which would unlink the block when the worker exits, so there the
+    # registration is dropped again. Workers that were handed the parent's
+    # running tracker (any later fork, spawn and forkserver) must leave it
+    # alone: the registration is the parent's. Decided once, before this
+    # process first attaches.
+    global own_tracker
+    if own_tracker is None:
+        own_tracker = resource_tracker._resource_tracker._fd is None
+    return own_tracker
+
+
+def write_chunk(task):
+    # Second pass: expand the divisors straight into the parent's block.
+    name, length, base, items = task
+    unregister = has_own_tracker()
+    block = shared_memory.SharedMemory(name=name)
+    if unregister:
+        resource_tracker.unregister(block._name, "shared_memory")
+    try:
+        data = numpy.ndarray(length, dtype=numpy.int64, buffer=block.buf)
+        for offset, factors in items:
+            found = get_divisors(factors)
+            data[base + offset:base + offset + len(found)] = found
+        del data
+    finally:
+        block.close()
+    return len(items)
+
+
+class SharedDivisors:
+    # One shared int64 block laid out as [offsets | values]: the divisors of
+    # the i-th number are values[offsets[i]:offsets[i + 1]]. Both are NumPy
+    # views on the block, nothing is copied. Drop every view taken from it
+    # before close(), which frees the block.
+    def __init__(self, block, count, total):
+        self.block = block
+        data = numpy.ndarray(count + 1 + total, dtype=numpy.int64, buffer=block.buf)
+        self.offsets = data[:count + 1]
+        self.values = data[count + 1:]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.values[self.offsets[index]:self.offsets[index + 1]]
+
+    def close(self):
+        self.offsets = self.values = None
+        self.block.close()
+        self.block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def divisors_shared(numbers, workers=None, stats=None):
+    numbers = list(numbers)
+    if any(n > INT64_MAX for n in numbers):
+        raise ValueError("divisors_shared works on int64, use divisors() for bigger numbers")
+    stats = {} if stats is None else stats
+    workers = workers or cpu_count()
+    chunks = plan_chunks(enumerate(numbers), min(len(numbers), workers * CHUNKS_PER_WORKER) or 1)
+
+    with get_pool(workers) as pool:
+        counts = numpy.zeros(len(numbers), dtype=numpy.int64)
+        factorizations = []
+        for items, cache_counts in pool.imap_unordered(factorize_chunk, chunks):
+            add_counts(stats, cache_counts)
+            stats["pickled_bytes"] = stats.get("pickled_bytes", 0) + len(pickle.dumps(items))
+            for position, count, factors in items:
+                counts[position] = count
+            factorizations.append(items)
+
+        offsets = numpy.zeros(len(numbers) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        total = int(offsets[-1])
+        length = len(numbers) + 1 + total
+        block = shared_memory.SharedMemory(create=True, size=length * 8)
+        try:
+            result = SharedDivisors(block, len(numbers), total)
+            result.offsets[:] = offsets
+            tasks = [(block.name, length, len(numbers) + 1,
+                      [(int(offsets[position]), factors) for position, count, factors in items if count])
+                     for items in factorizations]
+            for _ in pool.imap_unordered(write_chunk, tasks):
+                pass
+        except BaseException:
+            block.close()
+            block.unlink()
+            raise
+    return result
+
+
+def measure_transport(numbers, workers=None):
+    # The same divisors three ways: the old one number per Pool.map task with
+    # lists pickled back, array chunks, and the shared block. Overhead is the
+    # time above the serial computation split over the workers.
+    workers = workers or cpu_count()
+    get_sieve()
+    reset_cache()
+    start = time.perf_counter()
+    expected = [divisors(n) for n in numbers]
+    compute = time.perf_counter() - start
+    parallel = compute / min(workers, cpu_count())
+    print(f"serial compute: {compute:.3f}s, {sum(map(len, expected))} divisors")
+
+    reset_cache()
+    start = time.perf_counter()
+    with Pool(processes=workers) as pool:
+        results = pool.map(divisors, numbers)
+    elapsed = time.perf_counter() - start
+    assert results == expected
+    report_transport("Pool.map lists", elapsed, parallel, len(pickle.dumps(results)))
+
+    reset_cache()
+    start = time.perf_counter()
+    results = divisors_batch(numbers, "process", workers)
+    elapsed = time.perf_counter() - start
+    assert [list(values) for values in results] == expected
+    report_transport("array chunks", elapsed, parallel, len(pickle.dumps(results)))
+
+    # Several rounds: from the second one on, forked workers share the
+    # resource tracker this process started in the first.
+    for number in range(3):
+        reset_cache()
+        stats = {}
+        start = time.perf_counter()
+        with divisors_shared(numbers, workers, stats) as shared:
+            elapsed = time.perf_counter() - start
+            assert all(shared[index].tolist() == values for index, values in enumerate(expected))
+        report_transport(f"shared memory, round {number + 1}", elapsed, parallel, stats.get("pickled_bytes", 0))
+
+
+def report_transport(name, elapsed, compute, pickled):
+    print(f"{name}: {elapsed:.3f}s, overhead {elapsed - compute:.3f}s, {pickled / 1024 ** 2:.1f} MiB pickled back")
+
+
+def factorize_array(numbers):
+    # Factorizes a whole array at once from the sieve. Round k finds the k-th
+    # smallest prime of every number and its exponent, so there are as many
+    # rounds as the most distinct primes any number has (8 below 10**7).
+    numbers = numpy.asarray(numbers, dtype=numpy.int64)
+    if len(numbers) and numbers.max() > SIEVE_LIMIT:
+        raise ValueError(f"numbers above the sieve bound {SIEVE_LIMIT}, use divisors_batch() for them")
+    spf = get_sieve()
+    valid = numbers >= 1
+    rest = numpy.where(valid, numbers, 1)
+    rounds = []
+    while True:
+        active = rest > 1
+        if not active.any():
+            break
+        p = numpy.where(active, spf[rest], 1).astype(numpy.int64)
+        exponent = numpy.zeros(len(numbers), dtype=numpy.int64)
+        divisible = active
+        while divisible.any():
+            rest[divisible] //= p[divisible]
+            exponent += divisible
+            divisible = active & (rest % p == 0)
+        rounds.append((p, exponent))
+    return valid, rounds
+
+
+def divisor_counts(numbers):
+    valid, rounds = factorize_array(numbers)
+    counts = valid.astype(numpy.int64)
+    for _, exponent in rounds:
+        counts *= exponent + 1
+    return counts
+
+
+def divisors_csr(numbers):
+    # Divisors of every number in CSR form: the divisors of numbers[i] are
+    # values[offsets[i]:offsets[i + 1]], sorted. Every round multiplies each
+    # partial divisor by p ** 0..e of its own number with numpy.repeat.
+    valid, rounds = factorize_array(numbers)
+    counts = valid.astype(numpy.int64)
+    for _, exponent in rounds:
+        counts *= exponent + 1
+    offsets = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=offsets[1:])
+
+    owner = numpy.flatnonzero(valid)
+    values = numpy.ones(len(owner), dtype=numpy.int64)
+    for p, exponent in rounds:
+        repeats = exponent[owner] + 1
+        starts = numpy.cumsum(repeats) - repeats
+        owner = numpy.repeat(owner, repeats)
+        power = numpy.arange(len(owner), dtype=numpy.int64) - numpy.repeat(starts, repeats)
+        values = numpy.repeat(values, repeats) * p[owner] ** power
+
+    # owner is still in ascending order, so one sort of (owner, value) keys
+    # sorts every number's divisors in place.
+    scale = SIEVE_LIMIT + 1
+    keys = owner * scale + values
+    keys.sort()
+    return offsets, keys - owner * scale
+
+
+def compare_csr(args):
+    # Same numbers below the sieve through divisors_csr and the process pool.
+    random.seed(args.seed)
+    numbers = [random.randint(1, min(args.max, SIEVE_LIMIT)) for _ in range(args.batch)]
+    get_sieve()
+
+    start = time.perf_counter()
+    offsets, values = divisors_csr(numbers)
+    elapsed = time.perf_counter() - start
+    print(f"numpy csr: {elapsed:.3f}s, {len(numbers) / elapsed:.0f} numbers/s, {len(values)} divisors")
+
+    start = time.perf_counter()
+    results = divisors_batch(numbers, "process", args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"process pool: {elapsed:.3f}s, {len(numbers) / elapsed:.0f} numbers/s, {sum(map(len, results))} divisors")
+    assert all(values[offsets[index]:offsets[index + 1]].tolist() == result.tolist()
+               for index, result in enumerate(results))
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Divisors of the test values or of a random batch")
+    parser.add_argument("--batch", type=int, help="time divisors_batch on this many random numbers")
+    parser.add_argument("--max", type=int, default=10 ** 12, help="largest random number")
+    parser.add_argument("--backend", choices=BACKENDS, nargs="+", default=list(BACKENDS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--transport", action="store_true",
+                        help="compare Pool.map lists, array chunks and shared memory on the batch")
+    parser.add_argument("--csr", action="store_true",
+                        help="compare divisors_csr with the process pool on numbers below the sieve bound")
+    parser.add_argument("--repeat", type=int, default=1, help="run the batch this many times per backend")
+    parser.add_argument("--cache", help="SQLite file that keeps factorizations between runs")
+    parser.add_argument("--cache-size", type=int, default=None, help="factorizations kept in memory")
+    return parser.parse_args(args)
+
+
+def compare_backends(args):
+    random.seed(args.seed)
+    numbers = [random.randint(1, args.max) for _ in range(args.batch)]
+    if args.transport:
+        measure_transport(numbers, args.workers)
+        return
+    if args.csr:
+        compare_csr(args)
+        return
+    expected = None
+    for backend in args.backend:
+        # Every backend starts from an empty memory cache.
+        reset_cache()
+        for attempt in range(1, args.repeat + 1):
+            stats = {}
+            start = time.perf_counter()
+            results = divisors_batch(numbers, backend, args.workers, stats)
+            elapsed = time.perf_counter() - start
+            total = sum(map(len, results))
+            if expected is not None:
+                assert results == expected, f"{backend} disagrees with {args.backend[0]}"
+            expected = results
+            print(f"{backend} #{attempt}: {elapsed:.3f}s, {len(numbers) / elapsed:.0f} numbers/s, {total} divisors, "
+                  f"cache {stats.get('hits', 0)} hits, {stats.get('disk_hits', 0)} disk hits, "
+                  f"{stats.get('misses', 0)} misses")
+
+
 if __name__ == '__main__':
-    test_numb = (128, 255, 99999, 10651060)
-    with Pool(processes=cpu_count()) as pool:
-        logger.debug(pool.map(calculating, test_numb))
+    args = parse_args()
+    configure(cache_size=args.cache_size, cache_path=args.cache)
+    if args.batch:
+        compare_backends(args)
+    else:
+        test_numb = (128, 255, 99999, 10651060)
+        with Pool(processes=cpu_count()) as pool:
+            results = pool.map(calculating, test_numb)
+        logger.debug(results)
+        (a,), (b,), (c,), (d,) = results
+        assert a == [1, 2, 4, 8, 16, 32, 64, 128]
+        assert b == [1, 3, 5, 15, 17, 51, 85, 255]
+        assert c == [1, 3, 9, 41, 123, 271, 369, 813, 2439, 11111, 33333, 99999]
+        assert d == [1, 2, 4, 5, 7, 10, 14, 20, 28, 35, 70, 140, 76079, 152158, 304316, 380395, 532553, 760790, 1065106, 1521580, 2130212, 2662765, 5325530, 10651060]
+        assert divisors_batch(test_numb) == [array("q", values) for values in (a, b, c, d)]
 
 #=====================================Test values==================================#
 # assert a == [1, 2, 4, 8, 16, 32, 64, 128]
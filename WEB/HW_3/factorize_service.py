@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import cpu_count
+
+import factorize
+from factorize import INT64_MAX, calculate_chunk, configure, get_divisors, get_settings, get_sieve
+
+
+def warm_up():
+    get_sieve()
+
+
+class FactorizeService:
+    # One process pool for the life of the service. Requests wait in a
+    # bounded queue; a dispatcher takes whatever is queued, up to max_batch,
+    # as one pool task. max_pending bounds the queue and max_in_flight the
+    # batches running at once, so a burst slows callers down instead of
+    # growing memory.
+    def __init__(self, workers=None, max_pending=1000, max_batch=64, max_in_flight=None, window=100_000):
+        self.workers = workers or cpu_count()
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.in_flight = asyncio.Semaphore(max_in_flight or self.workers * 2)
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.executor = None
+        self.dispatcher = None
+        self.batches = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=configure,
+                                            initargs=get_settings())
+        # Every worker builds its sieve now rather than on the first request.
+        await asyncio.gather(*(loop.run_in_executor(self.executor, warm_up) for _ in range(self.workers)))
+        self.dispatcher = asyncio.create_task(self.dispatch())
+        return self
+
+    async def stop(self):
+        await self.queue.join()
+        self.dispatcher.cancel()
+        await asyncio.gather(self.dispatcher, *self.batches, return_exceptions=True)
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def divisors(self, n, wait=True):
+        # With wait=False a full queue raises asyncio.QueueFull right away,
+        # for callers that would rather turn a request down than wait.
+        if n > INT64_MAX:
+            raise ValueError("the service works on int64, use factorize.divisors() for bigger numbers")
+        start = time.perf_counter()
+        # configure() replaces the cache and the bound, so both are read from the module.
+        factors = factorize.cache.peek(n) if n > factorize.SIEVE_LIMIT else None
+        if factors is not None:
+            self.record(start)
+            return array("q", get_divisors(factors))
+
+        future = asyncio.get_running_loop().create_future()
+        if wait:
+            await self.queue.put((n, future))
+        else:
+            self.queue.put_nowait((n, future))
+        result = await future
+        self.record(start)
+        return result
+
+    async def stream(self, numbers):
+        # Yields (n, divisors) in the order they finish, not the input order.
+        # Numbers are queued as they are consumed, so a long input never
+        # holds more than max_pending slots.
+        tasks = set()
+        for n in numbers:
+            task = asyncio.create_task(self.divisors(n))
+            task.n = n
+            tasks.add(task)
+            if len(tasks) >= self.queue.maxsize:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.n, task.result()
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.n, task.result()
+
+    async def dispatch(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.in_flight.acquire()
+            task = asyncio.create_task(self.run_batch(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            chunk = [(index, n) for index, (n, _) in enumerate(batch)]
+            positions, offsets, values, _, learned = await loop.run_in_executor(
+                self.executor, partial(calculate_chunk, chunk, learn=True))
+            for n, factors in learned:
+                factorize.cache.put(n, factors, store=False)
+            for index, position in enumerate(positions):
+                future = batch[position][1]
+                if not future.done():
+                    future.set_result(values[offsets[index]:offsets[index + 1]])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            self.in_flight.release()
+            for _ in batch:
+                self.queue.task_done()
+
+    def record(self, start):
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - start)
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(share):
+            return latencies[min(len(latencies) - 1, int(share * len(latencies)))] * 1000 if latencies else None
+
+        return {
+            "requests": self.requests,
+            "queued": self.queue.qsize(),
+            "batches_in_flight": len(self.batches),
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+        }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Stream divisors of a random batch through the service")
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--max", type=int, default=10 ** 12, help="largest random number")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(args)
+
+
+async def main(args):
+    random.seed(args.seed)
+    numbers = [random.randint(1, args.max) for _ in range(args.batch)]
+    async with FactorizeService(args.workers, args.max_pending, args.max_batch) as service:
+        assert list(await service.divisors(10651060)) == [1, 2, 4, 5, 7, 10, 14, 20, 28, 35, 70, 140, 76079, 152158,
+                                                          304316, 380395, 532553, 760790, 1065106, 1521580, 2130212,
+                                                          2662765, 5325530, 10651060]
+        start = time.perf_counter()
+        total = 0
+        async for n, found in service.stream(numbers):
+            total += len(found)
+        elapsed = time.perf_counter() - start
+        print(f"{len(numbers)} numbers, {total} divisors in {elapsed:.3f}s, {len(numbers) / elapsed:.0f} numbers/s")
+        print(service.metrics())
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -1,71 +1,276 @@
-import shutil
-from pathlib import Path
-from random import randint, choice, choices
-import numpy
-from PIL import Image
-
-MESSAGE = "Hello, Привіт"
-
-
-def get_random_filename():
-    random_value = '()+,-0123456789;=@ABCDEFGHIJKLMNOPQRSTUVWXYZ[]^_`abcdefghijklmnopqrstuvwxyz' \
-                   '{}~абвгдеєжзиіїйклмнопрстуфхцчшщьюяАБВГДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ'
-    return ''.join(choices(random_value, k=8))
-
-
-def generate_text_files(path):
-    documents = ('DOC', 'DOCX', 'TXT', 'PDF', 'XLSX', 'PPTX')
-    with open(path / f"{get_random_filename()}.{choice(documents).lower()}", "wb") as f:
-        f.write(MESSAGE.encode())
-
-
-def generate_archive_files(path):
-    archive = ('ZIP', 'GZTAR', 'TAR')
-    shutil.make_archive(f"{path}/{get_random_filename()}", f'{choice(archive).lower()}', path)
-
-
-def generate_image(path):
-    images = ('JPEG', 'PNG', 'JPG')
-    image_array = numpy.random.rand(100, 100, 3) * 255
-    image = Image.fromarray(image_array.astype('uint8'))
-    image.save(f"{path}/{get_random_filename()}.{choice(images).lower()}")
-
-
-def generate_folders(path):
-    folder_name = ['temp', 'folder', 'dir', 'tmp', 'OMG', 'is_it_true', 'no_way', 'find_it']
-    folder_path = Path(
-        f"{path}/" + '/'.join(choices(folder_name, weights=[10, 10, 1, 1, 1, 1, 1, 1], k=randint(5, len(folder_name)))))
-    folder_path.mkdir(parents=True, exist_ok=True)
-
-
-def generate_folder_forest(path):
-    for i in range(0, randint(2, 5)):
-        generate_folders(path)
-
-
-def generate_random_files(path):
-    for i in range(3, randint(5, 7)):
-        function_list = [generate_text_files, generate_archive_files, generate_image]
-        choice(function_list)(path)
-
-
-def parse_folder_recursion(path):
-    for elements in path.iterdir():
-        if elements.is_dir():
-            generate_random_files(path)
-            parse_folder_recursion(elements)
-
-
-def exist_parent_folder(path):
-    path.mkdir(parents=True, exist_ok=True)
-
-
-def file_generator(path):
-    exist_parent_folder(path)
-    generate_folder_forest(path)
-    parse_folder_recursion(path)
-
-
-if __name__ == '__main__':
-    parent_folder_path = Path("Temp")
-    file_generator(parent_folder_path)
+import argparse
+import gzip
+import io
+import math
+import os
+import shutil
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from random import Random, randint, choice, choices
+
+MESSAGE = "Hello, Привіт"
+
+
+def get_random_filename():
+    random_value = '()+,-0123456789;=@ABCDEFGHIJKLMNOPQRSTUVWXYZ[]^_`abcdefghijklmnopqrstuvwxyz' \
+                   '{}~абвгдеєжзиіїйклмнопрстуфхцчшщьюяАБВГДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ'
+    return ''.join(choices(random_value, k=8))
+
+
+def generate_text_files(path):
+    documents = ('DOC', 'DOCX', 'TXT', 'PDF', 'XLSX', 'PPTX')
+    with open(path / f"{get_random_filename()}.{choice(documents).lower()}", "wb") as f:
+        f.write(MESSAGE.encode())
+
+
+def generate_archive_files(path):
+    archive = ('ZIP', 'GZTAR', 'TAR')
+    shutil.make_archive(f"{path}/{get_random_filename()}", f'{choice(archive).lower()}', path)
+
+
+def generate_image(path):
+    import numpy
+    from PIL import Image
+
+    images = ('JPEG', 'PNG', 'JPG')
+    image_array = numpy.random.rand(100, 100, 3) * 255
+    image = Image.fromarray(image_array.astype('uint8'))
+    image.save(f"{path}/{get_random_filename()}.{choice(images).lower()}")
+
+
+def generate_folders(path):
+    folder_name = ['temp', 'folder', 'dir', 'tmp', 'OMG', 'is_it_true', 'no_way', 'find_it']
+    folder_path = Path(
+        f"{path}/" + '/'.join(choices(folder_name, weights=[10, 10, 1, 1, 1, 1, 1, 1], k=randint(5, len(folder_name)))))
+    folder_path.mkdir(parents=True, exist_ok=True)
+
+
+def generate_folder_forest(path):
+    for i in range(0, randint(2, 5)):
+        generate_folders(path)
+
+
+def generate_random_files(path):
+    for i in range(3, randint(5, 7)):
+        function_list = [generate_text_files, generate_archive_files, generate_image]
+        choice(function_list)(path)
+
+
+def parse_folder_recursion(path):
+    for elements in path.iterdir():
+        if elements.is_dir():
+            generate_random_files(path)
+            parse_folder_recursion(elements)
+
+
+def exist_parent_folder(path):
+    path.mkdir(parents=True, exist_ok=True)
+
+
+def file_generator(path):
+    exist_parent_folder(path)
+    generate_folder_forest(path)
+    parse_folder_recursion(path)
+
+
+LATIN = "abcdefghijklmnopqrstuvwxyz0123456789()+,-;=@[]^_`{}~"
+CYRILLIC = "абвгдеєжзиіїйклмнопрстуфхцчшщьюяАБВГДЕЄЖЗИІЇЙКЛМНОПРСТУФХЦЧШЩЬЮЯ"
+FOLDER_NAMES = ('temp', 'folder', 'dir', 'tmp', 'OMG', 'is_it_true', 'no_way', 'find_it')
+
+KINDS = {
+    "document": ('txt', 'pdf', 'doc', 'docx', 'xlsx', 'pptx'),
+    "image": ('jpeg', 'png', 'jpg', 'svg'),
+    "audio": ('mp3', 'ogg', 'wav', 'amr'),
+    "video": ('avi', 'mp4', 'mov', 'mkv'),
+    "archive": ('zip', 'tar', 'tar.gz'),
+    "unknown": ('csv', 'bin', 'log', ''),
+}
+WEIGHTS = {"document": 40, "image": 25, "audio": 8, "video": 4, "archive": 3, "unknown": 20}
+
+# Set once per worker by init_worker, so tasks only carry a range of file numbers.
+worker = {}
+
+
+def get_name(rng, cyrillic, length=8):
+    alphabet = CYRILLIC if rng.random() < cyrillic else LATIN
+    return ''.join(rng.choices(alphabet, k=length))
+
+
+def encode_png(rng, width=32, height=32):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b""))
+
+
+def encode_jpeg():
+    # One fixed 8x8 grey baseline JPEG: a single component and block, and
+    # Huffman tables holding one code each, for DC 0 and end of block.
+    def segment(marker, data):
+        return b"\xff" + marker + struct.pack(">H", len(data) + 2) + data
+
+    return (b"\xff\xd8" + segment(b"\xdb", b"\x00" + b"\x01" * 64)
+            + segment(b"\xc0", struct.pack(">BHHB", 8, 8, 8, 1) + b"\x01\x11\x00")
+            + segment(b"\xc4", b"\x00\x01" + b"\x00" * 15 + b"\x00")
+            + segment(b"\xc4", b"\x10\x01" + b"\x00" * 15 + b"\x00")
+            + segment(b"\xda", b"\x01\x01\x00\x00\x3f\x00") + b"\x3f\xff\xd9")
+
+
+def encode_archives(members):
+    archives = {}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0)), data, zipfile.ZIP_DEFLATED)
+    archives['zip'] = buffer.getvalue()
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    archives['tar'] = buffer.getvalue()
+    # A fixed gzip mtime keeps the payload the same from run to run.
+    archives['tar.gz'] = gzip.compress(archives['tar'], mtime=0)
+    return archives
+
+
+def build_payloads(seed):
+    # Everything with a real format is encoded once per worker and then only
+    # written out; regular files are slices of one shared filler buffer.
+    rng = Random(f"{seed}:payloads")
+    png = encode_png(rng)
+    # Built by hand, so the bytes are the same whether or not Pillow is installed.
+    jpeg = encode_jpeg()
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg" width="8" height="8"><rect width="8" height="8"/></svg>'
+    members = [("readme.txt", MESSAGE.encode()), ("Привіт.txt", MESSAGE.encode() * 64), ("logo.png", png)]
+    payloads = {'png': png, 'jpg': jpeg, 'jpeg': jpeg, 'svg': svg}
+    payloads.update(encode_archives(members))
+    return payloads
+
+
+def choice_folder_name(rng, cyrillic):
+    return get_name(rng, cyrillic, 6) if rng.random() < cyrillic else rng.choice(FOLDER_NAMES)
+
+
+def plan_folders(root, folders, depth, cyrillic, seed):
+    rng = Random(f"{seed}:folders")
+    paths, open_folders = [root], [(root, 0)]
+    for number in range(1, folders):
+        parent, level = rng.choice(open_folders)
+        name = choice_folder_name(rng, cyrillic) + f"_{number}"
+        path = os.path.join(parent, name)
+        paths.append(path)
+        if level + 1 < depth:
+            open_folders.append((path, level + 1))
+    return paths
+
+
+def init_worker(folders, settings):
+    worker["folders"] = folders
+    worker["settings"] = settings
+    worker["payloads"] = build_payloads(settings["seed"])
+    worker["filler"] = memoryview((MESSAGE.encode() * (settings["max_size"] // len(MESSAGE.encode()) + 1))
+                                  [:settings["max_size"]])
+    worker["kinds"] = list(WEIGHTS)
+    worker["weights"] = list(WEIGHTS.values())
+
+
+def write_file(path, *chunks):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for data in chunks:
+            os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def write_range(start, count):
+    # The generator is seeded from the first file number, so the tree does
+    # not depend on how many workers wrote it.
+    folders, settings, payloads = worker["folders"], worker["settings"], worker["payloads"]
+    filler, kinds, weights = worker["filler"], worker["kinds"], worker["weights"]
+    rng = Random(f"{settings['seed']}:{start}")
+    mu, sigma, cyrillic = settings["mu"], settings["sigma"], settings["cyrillic"]
+    written = 0
+
+    for number in range(start, start + count):
+        kind = rng.choices(kinds, weights)[0]
+        extension = rng.choice(KINDS[kind])
+        name = f"{get_name(rng, cyrillic)}_{number}" + (f".{extension}" if extension else "")
+        path = os.path.join(rng.choice(folders), name)
+
+        payload = payloads.get(extension)
+        if payload is not None:
+            write_file(path, payload)
+            written += len(payload)
+            continue
+        size = min(int(rng.lognormvariate(mu, sigma)), len(filler))
+        if rng.random() < settings["duplicates"]:
+            write_file(path, filler[:size])
+            written += size
+        else:
+            # A file number up front keeps files of the same size distinct.
+            header = f"{number}\n".encode()
+            write_file(path, header, filler[:max(size - len(header), 0)])
+            written += len(header) + max(size - len(header), 0)
+    return count, written
+
+
+def generate_tree(path, files=1000, depth=6, folder_size=100, cyrillic=0.3, median_size=4096, sigma=1.0,
+                  max_size=1024 * 1024, duplicates=0.0, seed=0, workers=None, chunk_size=5000):
+    root = os.fspath(path)
+    folders = plan_folders(root, max(1, files // folder_size), depth, cyrillic, seed)
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    settings = {"seed": seed, "cyrillic": cyrillic, "mu": math.log(median_size), "sigma": sigma,
+                "max_size": max_size, "duplicates": duplicates}
+    ranges = [(start, min(chunk_size, files - start)) for start in range(0, files, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        init_worker(folders, settings)
+        results = [write_range(start, count) for start, count in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(folders, settings)) as executor:
+            results = list(executor.map(write_range, *zip(*ranges)))
+    return sum(count for count, _ in results), sum(written for _, written in results)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="Generate a junk folder tree for the sorters")
+    parser.add_argument("path", type=Path, nargs="?", default=Path("Temp"))
+    parser.add_argument("--files", type=int, default=None, help="number of files; without it the small legacy tree is made")
+    parser.add_argument("--depth", type=int, default=6, help="deepest folder level")
+    parser.add_argument("--folder-size", type=int, default=100, help="average files per folder")
+    parser.add_argument("--cyrillic", type=float, default=0.3, help="share of names in Cyrillic")
+    parser.add_argument("--median-size", type=int, default=4096, help="median size of plain files in bytes")
+    parser.add_argument("--sigma", type=float, default=1.0, help="spread of the log-normal file size")
+    parser.add_argument("--max-size", type=int, default=1024 * 1024)
+    parser.add_argument("--duplicates", type=float, default=0.0, help="share of plain files left byte-identical")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.files is None:
+        file_generator(args.path)
+    else:
+        start = time.perf_counter()
+        count, written = generate_tree(args.path, args.files, args.depth, args.folder_size, args.cyrillic,
+                                       args.median_size, args.sigma, args.max_size, args.duplicates, args.seed,
+                                       args.workers)
+        elapsed = time.perf_counter() - start
+        print(f"{count} files, {written / 1024 ** 2:.1f} MiB in {elapsed:.1f}s, {count / elapsed:.0f} files/s")